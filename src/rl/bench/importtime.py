@@ -0,0 +1,160 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import os
+import re
+import subprocess
+import sys
+from typing import Optional
+
+# package -> (cumulative) time in microseconds
+ImportTimes = dict[str, int]
+
+
+class ImportBenchmark:
+    """
+    Measure the cold import of a module, by "python -X importtime":
+    1.  every measurement in a fresh interpreter, i.e., nothing cached
+    2.  per top-level package: the cumulative import-time
+    3.  check that no heavy package is pulled in by the light modules
+
+    NOTE:
+    1.  the light modules must stay importable without torch, sb3 and
+    tensorboard; these are only imported on first use
+
+    """
+
+    packages_heavy = ("torch", "stable_baselines3", "tensorboard")
+    modules_light = (
+        "src.rl.shetris.env.shenv",
+        "src.rl.shetris.env.reporter.reporter",
+        "src.rl.shetris.env.reporter.combi",
+    )
+
+    # "import time: self [us] | cumulative | imported package"
+    _pattern = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)$")
+
+    def __init__(self, n_runs: int = 3, cwd: Optional[str] = None):
+        self._n_runs = n_runs
+        self._cwd = os.getcwd() if cwd is None else cwd
+
+    def _get_stderr(self, module: str) -> str:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import {0}".format(module)],
+            cwd=self._cwd,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(
+                "[IMPORT] {0} failed:\n{1}".format(module, result.stderr)
+            )
+
+        return result.stderr
+
+    @staticmethod
+    def _get_lines(stderr: str) -> list[tuple[int, int, str]]:
+        """
+        :param stderr: of "python -X importtime"
+        :return: (cumulative-time, depth, name) of every imported module
+        """
+
+        lines = []
+        for line in stderr.splitlines():
+            match = ImportBenchmark._pattern.match(line)
+            if match is not None:
+                __, cumulative, indent, name = match.groups()
+                lines.append((int(cumulative), len(indent) // 2, name))
+
+        return lines
+
+    @staticmethod
+    def parse(stderr: str) -> ImportTimes:
+        """
+        The cumulative time of every top-level package:
+        ->  summed over its outermost imports only, the nested ones are
+        contained therein
+
+        :param stderr: of "python -X importtime"
+        :return:
+        """
+
+        times = {}
+        for cumulative, depth, name in ImportBenchmark._get_lines(stderr):
+            if depth == 0:
+                package = name.split(".")[0]
+                times[package] = times.get(package, 0) + cumulative
+
+        return times
+
+    def measure(self, module: str) -> ImportTimes:
+        """
+        The best (minimum) over all runs
+
+        :param module:
+        :return:
+        """
+
+        runs = [
+            ImportBenchmark.parse(self._get_stderr(module))
+            for __ in range(self._n_runs)
+        ]
+        return {
+            package: min(run.get(package, 0) for run in runs) for package in runs[0]
+        }
+
+    def get_heavy(self, module: str) -> list[str]:
+        """
+        :param module:
+        :return: the heavy packages imported along with the module, at any depth
+        """
+
+        imported = {
+            name.split(".")[0]
+            for __, __, name in ImportBenchmark._get_lines(self._get_stderr(module))
+        }
+        return [package for package in self.packages_heavy if package in imported]
+
+    def check(self) -> bool:
+        """
+        Print, for every light module, its import-time and any heavy package
+        it pulls in
+
+        :return: if every light module is free of heavy packages
+        """
+
+        is_light = True
+        for module in self.modules_light:
+            times = self.measure(module)
+            heavy = self.get_heavy(module)
+            print(
+                "[IMPORT] {0}: {1:.1f}ms{2}".format(
+                    module,
+                    times.get(module.split(".")[0], 0) / 1e3,
+                    "" if not heavy else ", HEAVY: {0}".format(", ".join(heavy)),
+                )
+            )
+            is_light = is_light and not heavy
+
+        return is_light
+
+
+if __name__ == "__main__":
+    pass
+    sys.exit(0 if ImportBenchmark().check() else 1)
@@ -0,0 +1,177 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import time
+from typing import Callable, Type
+
+import numpy as np
+
+from src.rl.shetris.analyzer.field import (
+    HeightAnalyzer,
+    ElevationAnalyzer,
+    HoleAnalyzer,
+)
+from src.rl.shetris.env.backend.base import Backend
+from src.rl.shetris.env.backend.engine import BackendEngine
+from src.rl.shetris.env.backend.placement import (
+    BackendEquivalence,
+    BackendPlacement,
+)
+from src.rl.shetris.env.shenv import ShetrisEnv
+
+
+class ScalingBenchmark:
+    """
+    Measure how the cost grows with the board-size:
+    1.  env-step, with every backend
+    ->  the placement-backend only where it reproduces the engine, see
+    BackendEquivalence; otherwise NaN
+    2.  the field-analyzers
+    3.  enumerating all candidate (action, obs)-pairs
+
+    All timings in microseconds per call.
+
+    """
+
+    sizes = ((20, 10), (40, 20), (100, 50))
+
+    def __init__(self, n_calls: int = 500, seed: int = 147, n_games_check: int = 10):
+        self._n_calls = n_calls
+        self._seed = seed
+        self._n_games_check = n_games_check
+
+    @staticmethod
+    def _get_field_stacked(size: tuple[int, int], rng: np.random.Generator):
+        """
+        A plausible mid-game field:
+        1.  every column stacked to a random height up to half the field
+        2.  some holes under the surface
+
+        :param size:
+        :param rng:
+        :return:
+        """
+
+        height, width = size
+        heights = rng.integers(0, height // 2, width)
+        rows = np.arange(height)[:, None]
+
+        return (rows >= height - heights) & (rng.random(size) < 0.9)
+
+    def _get_env(self, size: tuple[int, int], backend_type: Type[Backend]):
+        env = ShetrisEnv(backend=backend_type(size), displayer=[])
+        env.action_space.seed(self._seed)
+        env.reset(seed=self._seed)
+
+        return env
+
+    def _time_steps(self, env: ShetrisEnv, func: Callable) -> float:
+        """
+        Time the function on every state of a random game:
+        1.  random actions, reset on game-over
+        2.  only the function itself is timed
+
+        :param env:
+        :param func:
+        :return:
+        """
+
+        time_total = 0.0
+        for __ in range(self._n_calls):
+            time_start = time.perf_counter()
+            func()
+            time_total += time.perf_counter() - time_start
+
+            __, __, done, __ = env.step(env.action_space.sample())
+            if done:
+                env.reset()
+
+        return time_total / self._n_calls * 1e6
+
+    def bench_step(self, size: tuple[int, int], backend_type: Type[Backend]):
+        env = self._get_env(size, backend_type)
+
+        time_start = time.perf_counter()
+        for __ in range(self._n_calls):
+            __, __, done, __ = env.step(env.action_space.sample())
+            if done:
+                env.reset()
+
+        return (time.perf_counter() - time_start) / self._n_calls * 1e6
+
+    def bench_analyzers(self, size: tuple[int, int]) -> float:
+        rng = np.random.default_rng(self._seed)
+        fields = [
+            ScalingBenchmark._get_field_stacked(size, rng)
+            for __ in range(self._n_calls)
+        ]
+
+        time_start = time.perf_counter()
+        for field in fields:
+            HeightAnalyzer.get_height_abs_sum(field)
+            ElevationAnalyzer.get_elevation_abs_sum(field)
+            HoleAnalyzer.get_n_holes_field(field)
+
+        return (time.perf_counter() - time_start) / self._n_calls * 1e6
+
+    def bench_candidates(self, size: tuple[int, int]) -> float:
+        from src.rl.shetris.env.reporter.combi import ActionToObs
+
+        env = self._get_env(size, BackendEngine)
+        action_to_obs = ActionToObs(env.engine, env.provider.obs_factory)
+
+        return self._time_steps(env, action_to_obs.get_action_to_obs)
+
+    def run(self) -> dict[tuple[int, int], dict[str, float]]:
+        """
+        Run all benchmarks on all sizes, print the table with the growth
+        relative to the smallest size
+
+        :return:
+        """
+
+        results = {}
+        for size in ScalingBenchmark.sizes:
+            results[size] = {
+                "step-engine": self.bench_step(size, BackendEngine),
+                "step-placement": (
+                    self.bench_step(size, BackendPlacement)
+                    if BackendEquivalence(size).check(self._n_games_check, self._seed)
+                    else np.nan
+                ),
+                "analyzers": self.bench_analyzers(size),
+                "candidates": self.bench_candidates(size),
+            }
+
+        base = results[ScalingBenchmark.sizes[0]]
+        for size, result in results.items():
+            print("[SIZE] {0}x{1}".format(*size))
+            for name, time_us in result.items():
+                print(
+                    "    {0:>16}: {1:>10.1f}us ({2:.1f}x)".format(
+                        name, time_us, time_us / base[name]
+                    )
+                )
+
+        return results
+
+
+if __name__ == "__main__":
+    pass
+    ScalingBenchmark().run()
@@ -0,0 +1,399 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import csv
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import gym
+import numpy as np
+
+# the player and env of this (worker-)process, see CurveEvaluator.run()
+_worker_state: dict[str, Any] = {}
+
+
+class CheckpointFinder:
+    """
+    Find every numbered checkpoint of a directory, as a reference:
+    1.  key: changes whenever the checkpoint is rewritten, i.e., for caching
+    2.  kind: "sb3", "dqn" or "dqn-legacy"
+    3.  n, step: the number and the training-step (None if unknown)
+    4.  path: what the worker loads
+
+    Supported directories:
+    1.  SaveLoad: the base-dir or its progress-dir, i.e., <n>.zip indexed by
+    the manifest (or, for saves before the manifest, by the filenames)
+    2.  ModelDqn: the progress-dir, i.e., <episode>.json of Checkpoint
+    ->  also the legacy saves before Checkpoint: the pickled model, named
+    <episode> only
+
+    """
+
+    @staticmethod
+    def find(directory: str) -> list[dict[str, Any]]:
+        progress_dir = Path(directory)
+        if (progress_dir / "progress").is_dir():
+            progress_dir = progress_dir / "progress"
+
+        if any(progress_dir.glob("*.zip")):
+            refs = CheckpointFinder._find_sb3(progress_dir)
+        else:
+            refs = CheckpointFinder._find_dqn(progress_dir)
+
+        refs.sort(key=lambda ref: ref["n"])
+        return refs
+
+    @staticmethod
+    def _find_sb3(progress_dir: Path) -> list[dict[str, Any]]:
+        from src.rl.util.sb3.saveload import SaveLoad
+
+        steps = {}
+        if (progress_dir / SaveLoad.manifest_name).is_file():
+            with open(progress_dir / SaveLoad.manifest_name) as f:
+                steps = {entry["n"]: entry["step"] for entry in json.load(f)["entries"]}
+
+        refs = []
+        for path in progress_dir.glob("*.zip"):
+            if not path.stem.isdigit():
+                continue
+            stat = path.stat()
+            refs.append(
+                {
+                    "key": "{0}-{1}-{2}".format(
+                        path.name, stat.st_size, stat.st_mtime_ns
+                    ),
+                    "kind": "sb3",
+                    "n": int(path.stem),
+                    "step": steps.get(int(path.stem)),
+                    "path": str(path),
+                }
+            )
+
+        return refs
+
+    @staticmethod
+    def _find_dqn(progress_dir: Path) -> list[dict[str, Any]]:
+        refs = {}
+        for path in progress_dir.iterdir():
+            if not path.name.isdigit():
+                continue
+            stat = path.stat()
+            refs[int(path.name)] = {
+                "key": "{0}-{1}-{2}".format(path.name, stat.st_size, stat.st_mtime_ns),
+                "kind": "dqn-legacy",
+                "n": int(path.name),
+                "step": None,
+                "path": str(path),
+            }
+
+        # a checkpoint takes precedence over a legacy save of the same number
+        for path in progress_dir.glob("*.json"):
+            if not path.stem.isdigit():
+                continue
+            with open(path) as f:
+                manifest = json.load(f)
+            refs[int(path.stem)] = {
+                # the weights-file is fresh on every save
+                "key": manifest["weights"],
+                "kind": "dqn",
+                "n": int(path.stem),
+                "step": manifest["meta"].get("step_num"),
+                "path": str(path),
+            }
+
+        return list(refs.values())
+
+
+def _init_worker(
+    alg: Optional[type],
+    env_maker: Callable[[], gym.Env],
+    max_pieces: int,
+    deterministic: bool,
+) -> None:
+    import torch
+
+    torch.set_num_threads(1)
+
+    _worker_state["alg"] = alg
+    _worker_state["env"] = env_maker()
+    _worker_state["max_pieces"] = max_pieces
+    _worker_state["deterministic"] = deterministic
+
+
+def _get_act(ref: dict[str, Any]) -> Callable[[Any], Any]:
+    """
+    Load the checkpoint, as the function from obs to action
+
+    :param ref:
+    :return:
+    """
+
+    if ref["kind"] == "sb3":
+        model = _worker_state["alg"].load(ref["path"], device="cpu")
+        deterministic = _worker_state["deterministic"]
+
+        return lambda obs: model.predict(obs, deterministic=deterministic)[0]
+
+    from src.rl.util.dqn.checkpoint import Checkpoint
+    from src.rl.util.dqn.inference import InferenceNumpy
+    from src.rl.util.dqn.network import DeepQNetwork
+    from src.rl.util.dqn.util import Agent
+
+    if ref["kind"] == "dqn-legacy":
+        import torch
+
+        # as Loader.load_model(): unpickle the whole (legacy) model
+        model = torch.load(ref["path"], map_location=lambda storage, loc: storage)
+    else:
+        path = Path(ref["path"])
+        state_dict = Checkpoint.load_state_dict(str(path.parent), path.stem)
+        model = DeepQNetwork(state_dict["conv1.0.weight"].shape[1])
+        model.load_state_dict(state_dict)
+    model.eval()
+    agent = Agent(InferenceNumpy(model), _worker_state["env"])
+
+    return lambda obs: agent.act_best()[0]
+
+
+def _eval_checkpoint(
+    task: tuple[dict[str, Any], list[int]],
+) -> tuple[str, list[int], list[int]]:
+    """
+    Play one game per seed with the checkpoint: no rendering, at most
+    max_pieces pieces per game
+
+    :param task: the checkpoint's reference, the seeds
+    :return: the key, n_lines and n_pieces of every game
+    """
+
+    ref, seeds = task
+    env, max_pieces = _worker_state["env"], _worker_state["max_pieces"]
+    act = _get_act(ref)
+
+    n_lines, n_pieces = [], []
+    for seed in seeds:
+        env.seed(seed)
+        obs, done = env.reset(), False
+        while not done and env.unwrapped.n_pieces < max_pieces:
+            obs, __, done, __ = env.step(act(obs))
+        n_lines.append(int(env.unwrapped.n_lines))
+        n_pieces.append(int(env.unwrapped.n_pieces))
+
+    return ref["key"], n_lines, n_pieces
+
+
+class CurveEvaluator:
+    """
+    The learning curve of a training-run: evaluate every checkpoint of a
+    directory (see CheckpointFinder), as lines and pieces per game against
+    the training-step
+
+    1.  common random numbers: every checkpoint plays the very same n_games
+    piece-tapes, derived from one seed as in PieceTape.from_seeds()
+    ->  differences along the curve are those of the checkpoints, not of luck
+    2.  in parallel: one checkpoint per task, over a pool of worker-processes
+    3.  cached: the results are kept in <directory>/curve.json, per evaluation-
+    setup (seed, n_games, max_pieces, deterministic)
+    ->  a rerun only evaluates the checkpoints new (or rewritten) since
+
+    """
+
+    cache_name = "curve.json"
+    curve_name = "curve.csv"
+
+    def __init__(
+        self,
+        directory: str,
+        alg: Optional[type] = None,
+        env_maker: Optional[Callable[[], gym.Env]] = None,
+        n_games: int = 20,
+        seed: int = 147,
+        max_pieces: int = 10000,
+        deterministic: bool = True,
+    ):
+        """
+        :param directory: of SaveLoad or of ModelDqn's progress
+        :param alg: the sb3-alg to load with; not needed for ModelDqn
+        :param env_maker: picklable, creates a headless gym-env; default: the
+        headless ShetrisEnv
+        :param n_games: per checkpoint
+        :param seed: master-seed of the piece-tapes
+        :param max_pieces: per game, as good agents might never top out
+        :param deterministic: of sb3's predict()
+        """
+
+        if env_maker is None:
+            from src.rl.result.info import ShetrisInfo
+
+            env_maker = ShetrisInfo.get_env_maker()
+
+        self.directory = directory
+        self._alg, self._env_maker = alg, env_maker
+        self.n_games, self.seed = n_games, seed
+        self.max_pieces, self.deterministic = max_pieces, deterministic
+
+    @property
+    def seeds(self) -> list[int]:
+        return [
+            int(s)
+            for s in np.random.SeedSequence(self.seed).generate_state(self.n_games)
+        ]
+
+    @property
+    def setup_name(self) -> str:
+        return "seed{0}-games{1}-pieces{2}-{3}".format(
+            self.seed,
+            self.n_games,
+            self.max_pieces,
+            "det" if self.deterministic else "stoch",
+        )
+
+    @property
+    def cache_filename(self) -> str:
+        return os.path.join(self.directory, CurveEvaluator.cache_name)
+
+    def _load_cache(self) -> dict[str, dict[str, Any]]:
+        if not os.path.isfile(self.cache_filename):
+            return {}
+        with open(self.cache_filename) as f:
+            return json.load(f)
+
+    def _write_cache(self, cache: dict[str, dict[str, Any]]) -> None:
+        with open(self.cache_filename + ".tmp", "w") as f:
+            json.dump(cache, f)
+        os.replace(self.cache_filename + ".tmp", self.cache_filename)
+
+    def run(self, n_workers: Optional[int] = None) -> list[dict[str, Any]]:
+        """
+        1.  evaluate every checkpoint not yet cached, caching every result as
+        soon as it arrives
+        2.  write and print the curve
+
+        :param n_workers: default: one per cpu
+        :return: the curve, a row per checkpoint, ordered by number
+        """
+
+        refs = CheckpointFinder.find(self.directory)
+        kinds = {ref["kind"] for ref in refs}
+        if "sb3" in kinds and self._alg is None:
+            raise ValueError("[CURVE] sb3-checkpoints need the alg to load with")
+
+        cache = self._load_cache()
+        results = cache.setdefault(self.setup_name, {})
+        refs_new = [ref for ref in refs if ref["key"] not in results]
+
+        if refs_new:
+            n_workers = min(n_workers or os.cpu_count() or 1, len(refs_new))
+            print(
+                "[CURVE] {0} checkpoints ({1} cached) on {2} workers".format(
+                    len(refs), len(refs) - len(refs_new), n_workers
+                )
+            )
+
+            time_start = time.perf_counter()
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(
+                n_workers,
+                initializer=_init_worker,
+                initargs=(
+                    self._alg,
+                    self._env_maker,
+                    self.max_pieces,
+                    self.deterministic,
+                ),
+            ) as pool:
+                seeds = self.seeds
+                for key, n_lines, n_pieces in pool.imap_unordered(
+                    _eval_checkpoint, [(ref, seeds) for ref in refs_new]
+                ):
+                    results[key] = {"n_lines": n_lines, "n_pieces": n_pieces}
+                    self._write_cache(cache)
+            print(
+                "[CURVE] evaluated in {0:.1f}s".format(time.perf_counter() - time_start)
+            )
+
+        curve = [CurveEvaluator._get_row(ref, results[ref["key"]]) for ref in refs]
+        self.write_curve(curve)
+        CurveEvaluator.print_curve(curve)
+
+        return curve
+
+    @staticmethod
+    def _get_row(ref: dict[str, Any], result: dict[str, list[int]]) -> dict[str, Any]:
+        row = {"n": ref["n"], "step": ref["step"]}
+        for name in ("n_lines", "n_pieces"):
+            values = np.array(result[name])
+            row[name] = float(values.mean())
+            row[name + "_std"] = float(values.std())
+            row[name + "_median"] = float(np.median(values))
+
+        return row
+
+    def write_curve(self, curve: list[dict[str, Any]]) -> None:
+        if not curve:
+            return
+        with open(os.path.join(self.directory, CurveEvaluator.curve_name), "w") as f:
+            writer = csv.DictWriter(f, fieldnames=list(curve[0]))
+            writer.writeheader()
+            writer.writerows(curve)
+
+    @staticmethod
+    def print_curve(curve: list[dict[str, Any]]) -> None:
+        for row in curve:
+            print(
+                "[CHECKPOINT] {0:>5} @ step {1:>9}: lines {2:>8.1f} (+-{3:.1f}), "
+                "pieces {4:>8.1f} (+-{5:.1f})".format(
+                    row["n"],
+                    "?" if row["step"] is None else row["step"],
+                    row["n_lines"],
+                    row["n_lines_std"],
+                    row["n_pieces"],
+                    row["n_pieces_std"],
+                )
+            )
+
+
+def curve_dqn_test():
+    script_path = os.path.dirname(os.path.abspath(__file__))
+    CurveEvaluator(
+        os.path.join(script_path, "../util/dqn/result/shetris/saveload/"),
+        n_games=10,
+    ).run()
+
+
+def curve_sb3_test():
+    from src.rl.result.info import ShetrisInfo
+    from src.rl.result.manager import RlManager
+
+    alg, __ = ShetrisInfo.get_algpol()
+    CurveEvaluator(
+        RlManager(ShetrisInfo).saveload_dir,
+        alg=alg,
+        env_maker=ShetrisInfo.get_env_maker(),
+        n_games=10,
+    ).run()
+
+
+if __name__ == "__main__":
+    pass
+    curve_dqn_test()
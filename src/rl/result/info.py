@@ -17,8 +17,9 @@
 #
 
 
+import functools
 import os
-from typing import Tuple, Type, Optional
+from typing import Tuple, Type, Optional, Callable
 
 import gym
 from stable_baselines3.common.base_class import BaseAlgorithm
@@ -50,6 +51,37 @@ class InfoProvider:
 
         pass
 
+    @staticmethod
+    def get_env_gym() -> gym.Env:
+        """
+        Provide only the gym-env, e.g., for visual runs
+
+        :return:
+        """
+
+        pass
+
+    @staticmethod
+    def get_env() -> VecEnv:
+        """
+        Provide only the sb3-env
+
+        :return:
+        """
+
+        pass
+
+    @staticmethod
+    def get_env_maker() -> Callable[[], gym.Env]:
+        """
+        Provide a (picklable) function that creates a headless gym-env, e.g.,
+        for evaluating in worker-processes
+
+        :return:
+        """
+
+        pass
+
     @staticmethod
     def get_algpol() -> Tuple[Type[BaseAlgorithm], Type[BasePolicy]]:
         """
@@ -96,13 +128,25 @@ class ShetrisInfo(InfoProvider):
 
     @staticmethod
     def get_envs() -> Tuple[gym.Env, VecEnv]:
+        return ShetrisInfo.get_env_gym(), ShetrisInfo.get_env()
+
+    @staticmethod
+    def get_env_gym() -> gym.Env:
+        from src.rl.shetris.env.shenv import ShetrisEnv
+
+        return ShetrisEnv()
+
+    @staticmethod
+    def get_env() -> VecEnv:
         from src.rl.shetris.env.shenv import ShetrisEnv
 
-        env_gym_type = ShetrisEnv
-        env_gym = env_gym_type()
-        env = EnvFactorySb3.get_env_dummy(env_gym_type)
+        return EnvFactorySb3.get_env_dummy(ShetrisEnv)
 
-        return env_gym, env
+    @staticmethod
+    def get_env_maker() -> Callable[[], gym.Env]:
+        from src.rl.shetris.env.shenv import ShetrisEnv
+
+        return functools.partial(ShetrisEnv, displayer=[])
 
     @staticmethod
     def get_algpol() -> Tuple[Type[BaseAlgorithm], Type[BasePolicy]]:
@@ -139,13 +183,24 @@ class CartpoleInfo(InfoProvider):
 
     @staticmethod
     def get_envs() -> Tuple[gym.Env, VecEnv]:
+        return CartpoleInfo.get_env_gym(), CartpoleInfo.get_env()
+
+    @staticmethod
+    def get_env_gym() -> gym.Env:
         from gym.envs.classic_control.cartpole import CartPoleEnv
 
-        env_gym_type = CartPoleEnv
-        env_gym = env_gym_type()
-        env = EnvFactorySb3.get_env_dummy(env_gym_type)
+        return CartPoleEnv()
 
-        return env_gym, env
+    @staticmethod
+    def get_env() -> VecEnv:
+        from gym.envs.classic_control.cartpole import CartPoleEnv
+
+        return EnvFactorySb3.get_env_dummy(CartPoleEnv)
+
+    @staticmethod
+    def get_env_maker() -> Callable[[], gym.Env]:
+        # with gym's TimeLimit of 500 steps: a good policy never fails
+        return functools.partial(gym.make, "CartPole-v1")
 
     @staticmethod
     def get_algpol() -> Tuple[Type[BaseAlgorithm], Type[BasePolicy]]:
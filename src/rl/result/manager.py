@@ -18,13 +18,14 @@
 
 
 import os.path
+import time
 from pathlib import Path
-from typing import Type
+from typing import Type, Optional, Callable, Any
 
 from src.rl.result.info import InfoProvider
 from src.rl.util.sb3.model import ModelFactory
 from src.rl.util.sb3.runner import Runner
-from src.rl.util.sb3.saveload import SaveLoad
+from src.rl.util.sb3.saveload import SaveLoad, RetentionPolicy
 from src.rl.util.sb3.training import Trainer
 
 
@@ -36,34 +37,99 @@ class RlManager:
         1.  untrained
         2.  from saved zip
 
+    NOTE:
+    1.  built lazily, i.e., only once (and if) used:
+        1.  the sb3-env and the model (loaded or created)
+        2.  the untrained model, only for compare_against_untrained()
+        3.  the gym-env, only for visual runs
+        4.  the sb3-env for evaluating, only if scoring
+    2.  evaluating never touches the training-env: resetting it would leave
+    the model with a stale last-obs for the next cycle of learn()
+    3.  every build is timed, see print_startup_report()
+
     """
 
-    def __init__(self, info_provider: Type[InfoProvider]):
-        self._env_gym, self._env = info_provider.get_envs()
-        self._alg, self._policy = info_provider.get_algpol()
+    def __init__(
+        self,
+        info_provider: Type[InfoProvider],
+        retention: Optional[RetentionPolicy] = None,
+        n_eval_episodes: int = 0,
+        base_dir: Optional[str] = None,
+        algpol: Optional[tuple[Any, Any]] = None,
+        model_kwargs: Optional[dict[str, Any]] = None,
+    ):
+        """
+        :param info_provider:
+        :param retention: which numbered saves to keep; default keeps all
+        :param n_eval_episodes: score every numbered save by the mean reward of
+        so many episodes; 0 for no scoring
+        :param base_dir: of all results; default: ./result/ next to this file
+        :param algpol: the (alg, policy)-pair; default: of the info_provider
+        :param model_kwargs: hyperparameters for creating the model
+        """
+
+        self.startup_timings: dict[str, float] = {}
+        time_start = time.perf_counter()
+
+        self._info_provider = info_provider
+        self._env_gym, self._env, self._env_eval = None, None, None
+        self._alg, self._policy = (
+            info_provider.get_algpol() if algpol is None else algpol
+        )
+        self.model_kwargs = {} if model_kwargs is None else dict(model_kwargs)
 
-        script_path = os.path.dirname(os.path.abspath(__file__))
-        self.base_dir = os.path.join(script_path, "./result/")
+        if base_dir is None:
+            script_path = os.path.dirname(os.path.abspath(__file__))
+            base_dir = os.path.join(script_path, "./result/")
+        self.base_dir = base_dir
         self.tensorboard_dir, self.saveload_dir = info_provider.get_abs_dirs(
             self.base_dir
         )
 
-        self._model_raw = ModelFactory.create_model(
-            self.env, self.alg, self.policy, self.tensorboard_dir
-        )
-        self.model = None
-        self.saveload = SaveLoad(self.saveload_dir)
+        self._model_raw, self._model = None, None
+        self._could_continue = False
+        self.saveload = SaveLoad(self.saveload_dir, retention=retention)
+        self.n_eval_episodes = n_eval_episodes
 
         self.init()
+        self.startup_timings["init"] = time.perf_counter() - time_start
+
+    def _timed(self, name: str, func: Callable, *args) -> Any:
+        time_start = time.perf_counter()
+        result = func(*args)
+        self.startup_timings[name] = time.perf_counter() - time_start
+
+        return result
+
+    def print_startup_report(self) -> None:
+        """
+        How long building every component took, in the order of building;
+        components never built do not appear
+
+        :return:
+        """
+
+        for name, time_s in self.startup_timings.items():
+            print("[STARTUP] {0:>10}: {1:.3f}s".format(name, time_s))
 
     @property
     def env_gym(self):
+        if self._env_gym is None:
+            self._env_gym = self._timed("env_gym", self._info_provider.get_env_gym)
         return self._env_gym
 
     @property
     def env(self):
+        if self._env is None:
+            self._env = self._timed("env", self._info_provider.get_env)
         return self._env
 
+    @property
+    def env_eval(self):
+        if self._env_eval is None:
+            self._env_eval = self._timed("env_eval", self._info_provider.get_env)
+        return self._env_eval
+
     @property
     def alg(self):
         return self._alg
@@ -74,8 +140,28 @@ class RlManager:
 
     @property
     def model_raw(self):
+        if self._model_raw is None:
+            self._model_raw = self._timed(
+                "model_raw",
+                ModelFactory.create_model,
+                self.env,
+                self.alg,
+                self.policy,
+                self.tensorboard_dir,
+                **self.model_kwargs,
+            )
         return self._model_raw
 
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self._timed("model", self._get_model_initial)
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+
     def _create_dirs(self) -> None:
         """
         Create all the paths required
@@ -91,53 +177,86 @@ class RlManager:
         """
         Some initial setups:
         1.  create all dirs
-        2.  load the model
+        2.  check if training could continue
+        ->  the model itself is only loaded (or created) once used
+
+        :return:
+        """
+
+        self._create_dirs()
+        self._could_continue = self._timed("saveload", self.saveload.init)
+
+    def _get_model_initial(self):
+        """
+        1.  load the model
         ->  explicitly specify the env:
         ->  though not required for just viewing the model, necessary for
         continuing training
+        2.  without any save: create the model
 
         :return:
         """
 
-        self._create_dirs()
-
-        if self.saveload.init():
+        if self._could_continue:
             print("CONTINUE!")
-            self.model = self.saveload.load_latest(self.alg, self.env)
+            return self.saveload.load_latest(self.alg, self.env)
         else:
             print("from scratch")
-            self.model = ModelFactory.create_model(
-                self.env, self.alg, self.policy, self.tensorboard_dir
+            return ModelFactory.create_model(
+                self.env,
+                self.alg,
+                self.policy,
+                self.tensorboard_dir,
+                **self.model_kwargs,
             )
 
-    def _train_save_one_cycle(self, n_steps: int) -> None:
+    def _train_save_one_cycle(self, n_steps: int) -> Optional[float]:
         """
         Perform one train-save cycle:
         1.  train the model
-        2.  save the in-progress model
+        2.  save the in-progress model, scored if so configured
 
-        :return:
+        :return: the score, None if not scoring
         """
 
         Trainer.train(self.model, n_steps)
-        self.saveload.save_numbered(self.model)
 
-    def train_save(self, n_cycles: int, n_steps: int) -> None:
+        score = None
+        if self.n_eval_episodes > 0:
+            score, __ = Runner.eval_sb3(self.model, self.env_eval, self.n_eval_episodes)
+        self.saveload.save_numbered(self.model, score)
+
+        return score
+
+    def train_save(
+        self,
+        n_cycles: int,
+        n_steps: int,
+        should_stop: Optional[Callable[[list[Optional[float]]], bool]] = None,
+    ) -> list[Optional[float]]:
         """
         Perform multiple train-save cycles:
         1.  train and save each cycle
-        2.  save the final model
+        2.  stop early, once should_stop() holds for the scores so far
+        3.  save the final model
 
         :param n_cycles:
         :param n_steps:
-        :return:
+        :param should_stop: given the scores of every cycle so far
+        :return: the score of every cycle (trained)
         """
 
+        scores = []
         for __ in range(n_cycles):
-            self._train_save_one_cycle(n_steps)
+            scores.append(self._train_save_one_cycle(n_steps))
+            if should_stop is not None and should_stop(scores):
+                print("[STOP] early, after {0} cycles".format(len(scores)))
+                break
 
         self.saveload.save_latest(self.model)
 
+        return scores
+
     def compare_against_untrained(self):
         """
         1.  Load the latest saved model
@@ -149,12 +268,36 @@ class RlManager:
         """
 
         print("[MODEL]-raw:")
-        Runner.eval_sb3(self.model_raw, self.env)
+        Runner.eval_sb3(self.model_raw, self.env_eval)
 
         print()
 
         print("[MODEL]-trained:")
-        Runner.eval_sb3(self.model, self.env)
+        Runner.eval_sb3(self.model, self.env_eval)
+
+    def eval_headless(
+        self,
+        n_episodes: int = 100,
+        n_workers: Optional[int] = None,
+        max_steps: int = 10000,
+    ):
+        """
+        Evaluate the model on many (seeded) episodes, in parallel and without
+        any rendering
+
+        :param n_episodes:
+        :param n_workers:
+        :param max_steps: per episode
+        :return:
+        """
+
+        return Runner.eval_parallel(
+            self.model,
+            self._info_provider.get_env_maker(),
+            n_episodes=n_episodes,
+            n_workers=n_workers,
+            max_steps=max_steps,
+        )
 
     def run_visual(self):
         """
@@ -181,7 +324,7 @@ class RlManager:
         """
 
         self.model = ModelFactory.create_model(
-            self.env, self.alg, self.policy, self.tensorboard_dir
+            self.env, self.alg, self.policy, self.tensorboard_dir, **self.model_kwargs
         )
 
         self.train_save(n_cycles, n_steps)
@@ -215,6 +358,12 @@ def auto_train():
     rt.train_save(500, 10000)
 
 
+def startup_test():
+    rt = setup_test()
+    rt.model
+    rt.print_startup_report()
+
+
 def load_eval_visual_test():
     rt = setup_test()
     rt.run_visual()
@@ -0,0 +1,484 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import csv
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Optional, Type
+
+import numpy as np
+
+from src.rl.result.info import InfoProvider
+
+
+class Uniform:
+    """
+    A continuous range, for random search only
+
+    """
+
+    def __init__(self, low: float, high: float, log: bool = False):
+        self.low, self.high, self.log = low, high, log
+
+    def sample(self, rng: np.random.Generator) -> float:
+        if self.log:
+            return float(math.exp(rng.uniform(math.log(self.low), math.log(self.high))))
+        return float(rng.uniform(self.low, self.high))
+
+
+class SweepSpace:
+    """
+    What to sweep over, every key one dimension:
+    1.  "alg": any of "dqn", "ppo", "a2c", see AlgPolFactory
+    2.  "policy" (optional): sb3's name of the policy, e.g., "MlpPolicy";
+    default: that of the alg
+    3.  everything else: a hyperparameter of the alg, e.g., learning_rate
+
+    Every dimension is either:
+    1.  a list of choices
+    2.  a Uniform range (random search only)
+
+    """
+
+    def __init__(self, **dims: Any):
+        if "alg" not in dims:
+            raise ValueError("[SWEEP] the space needs an alg-dimension")
+        self._dims = {
+            key: dim if isinstance(dim, (list, Uniform)) else [dim]
+            for key, dim in dims.items()
+        }
+
+    def get_grid(self) -> list[dict[str, Any]]:
+        """
+        Every combination of the choices
+
+        :return:
+        """
+
+        for key, dim in self._dims.items():
+            if isinstance(dim, Uniform):
+                raise ValueError(
+                    "[SWEEP] grid-search over the range of {0}".format(key)
+                )
+
+        keys = list(self._dims)
+        return [
+            dict(zip(keys, values))
+            for values in itertools.product(*self._dims.values())
+        ]
+
+    def get_random(self, n_trials: int, seed: int = 147) -> list[dict[str, Any]]:
+        """
+        Sample every dimension independently: uniformly of the choices or
+        from the range
+
+        :param n_trials:
+        :param seed:
+        :return:
+        """
+
+        rng = np.random.default_rng(seed)
+        return [
+            {
+                key: (
+                    dim.sample(rng)
+                    if isinstance(dim, Uniform)
+                    else dim[rng.integers(len(dim))]
+                )
+                for key, dim in self._dims.items()
+            }
+            for __ in range(n_trials)
+        ]
+
+
+class MedianStopper:
+    """
+    Stop a trial whose score, after some cycle, is below the median of the
+    scores that the other trials had after the same cycle
+
+    NOTE:
+    1.  the trials share their scores by the progress-file in their own
+    directory, thus work across processes
+    2.  never stops before grace_cycles, nor with less than min_trials others
+    to compare to
+
+    """
+
+    progress_name = "progress.json"
+
+    def __init__(self, grace_cycles: int = 2, min_trials: int = 3):
+        self.grace_cycles = grace_cycles
+        self.min_trials = min_trials
+
+    @staticmethod
+    def write_progress(trial_dir: str, scores: list[Optional[float]]) -> None:
+        filename = os.path.join(trial_dir, MedianStopper.progress_name)
+        with open(filename + ".tmp", "w") as f:
+            json.dump({"scores": scores}, f)
+        os.replace(filename + ".tmp", filename)
+
+    @staticmethod
+    def read_progress(trial_dir: str) -> list[Optional[float]]:
+        filename = os.path.join(trial_dir, MedianStopper.progress_name)
+        if not os.path.isfile(filename):
+            return []
+        with open(filename) as f:
+            return json.load(f)["scores"]
+
+    def should_stop(
+        self, sweep_dir: str, trial_id: str, scores: list[Optional[float]]
+    ) -> bool:
+        """
+        :param sweep_dir:
+        :param trial_id: the stopping candidate
+        :param scores: of the candidate, every cycle so far
+        :return:
+        """
+
+        cycle = len(scores) - 1
+        if cycle < self.grace_cycles or scores[-1] is None:
+            return False
+
+        scores_others = []
+        for trial_dir in Path(sweep_dir).iterdir():
+            if not trial_dir.is_dir() or trial_dir.name == trial_id:
+                continue
+            progress = MedianStopper.read_progress(str(trial_dir))
+            if len(progress) > cycle and progress[cycle] is not None:
+                scores_others.append(progress[cycle])
+
+        if len(scores_others) < self.min_trials:
+            return False
+        return scores[-1] < float(np.median(scores_others))
+
+
+def _init_worker(n_threads: int) -> None:
+    # torch is already imported by now (through the info-providers): the
+    # OMP/MKL-variables are set by the parent instead, see Sweep.run()
+    import torch
+
+    torch.set_num_threads(n_threads)
+
+
+def _run_trial(spec: dict[str, Any]) -> dict[str, Any]:
+    """
+    One trial in a worker: train its own RlManager in its own directory
+
+    :param spec: see Sweep._get_spec()
+    :return: the result-row of the trial
+    """
+
+    from src.rl.result.manager import RlManager
+    from src.rl.util.sb3.model import AlgPolFactory
+
+    config, trial_dir = spec["config"], spec["trial_dir"]
+    hyperparams = {
+        key: value for key, value in config.items() if key not in ("alg", "policy")
+    }
+    alg, policy = getattr(AlgPolFactory, "get_{0}".format(config["alg"]))()
+    if "policy" in config:
+        policy = config["policy"]
+
+    stopper: Optional[MedianStopper] = spec["stopper"]
+
+    def should_stop(scores: list[Optional[float]]) -> bool:
+        MedianStopper.write_progress(trial_dir, scores)
+        return stopper is not None and stopper.should_stop(
+            spec["sweep_dir"], spec["trial_id"], scores
+        )
+
+    time_start = time.perf_counter()
+    manager = RlManager(
+        spec["info_provider"],
+        n_eval_episodes=spec["n_eval_episodes"],
+        base_dir=trial_dir,
+        algpol=(alg, policy),
+        model_kwargs=hyperparams,
+    )
+    scores = manager.train_save(spec["n_cycles"], spec["n_steps"], should_stop)
+    scores_valid = [score for score in scores if score is not None]
+
+    result = {
+        "trial_id": spec["trial_id"],
+        **config,
+        "n_cycles": len(scores),
+        "stopped": len(scores) < spec["n_cycles"],
+        "score_final": scores_valid[-1] if scores_valid else None,
+        "score_best": max(scores_valid) if scores_valid else None,
+        "time": time.perf_counter() - time_start,
+    }
+    with open(os.path.join(trial_dir, Sweep.result_name), "w") as f:
+        json.dump(result, f)
+
+    return result
+
+
+class Sweep:
+    """
+    Run many trials of (alg, policy, hyperparameters) concurrently:
+    1.  every trial in its own worker-process, limited to n_threads of torch
+    2.  every trial in its own directory under the sweep-dir:
+        <...>/sweep_dir
+            |__ ./<trial_id>/
+            |   |__ config.json
+            |   |__ progress.json: the score of every cycle so far
+            |   |__ result.json: only once finished
+            |   |__ ./shetris/...: of the RlManager
+            |__ summary.csv
+    3.  optionally, stop poor trials early (see MedianStopper)
+
+    NOTE:
+    1.  finished trials (with a result.json) are not run again, i.e., an
+    interrupted sweep continues where it stopped
+    2.  an interrupted trial (without a result.json) is run again from
+    scratch: its saves and progress are removed first, as RlManager would
+    otherwise continue from them with a fresh budget of cycles
+    3.  every worker runs one trial only, thus starts fresh
+
+    """
+
+    config_name = "config.json"
+    result_name = "result.json"
+    summary_name = "summary.csv"
+
+    def __init__(
+        self,
+        info_provider: Type[InfoProvider],
+        sweep_dir: str,
+        n_cycles: int = 10,
+        n_steps: int = 10000,
+        n_eval_episodes: int = 5,
+        stopper: Optional[MedianStopper] = None,
+    ):
+        """
+        :param info_provider:
+        :param sweep_dir:
+        :param n_cycles: at most, per trial
+        :param n_steps: per cycle
+        :param n_eval_episodes: score of every cycle
+        :param stopper: None to never stop early
+        """
+
+        if stopper is not None and n_eval_episodes <= 0:
+            raise ValueError("[SWEEP] early-stopping needs scoring")
+
+        self._info_provider = info_provider
+        self.sweep_dir = sweep_dir
+        self.n_cycles, self.n_steps = n_cycles, n_steps
+        self.n_eval_episodes = n_eval_episodes
+        self.stopper = stopper
+
+    def _get_spec(self, trial_id: str, config: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "trial_id": trial_id,
+            "config": config,
+            "trial_dir": os.path.join(self.sweep_dir, trial_id),
+            "sweep_dir": self.sweep_dir,
+            "info_provider": self._info_provider,
+            "n_cycles": self.n_cycles,
+            "n_steps": self.n_steps,
+            "n_eval_episodes": self.n_eval_episodes,
+            "stopper": self.stopper,
+        }
+
+    def _write_config(self, trial_id: str, config: dict[str, Any]) -> None:
+        """
+        1.  write the config of a new trial
+        2.  for an existing one, check that it is the same config
+        ->  a finished trial of another config must not be taken as a result
+
+        :param trial_id:
+        :param config:
+        :return:
+        """
+
+        filename = Path(self.sweep_dir, trial_id, Sweep.config_name)
+        if filename.is_file():
+            with open(filename) as f:
+                if json.load(f) != json.loads(json.dumps(config)):
+                    raise ValueError(
+                        "[SWEEP] {0} holds another config".format(trial_id)
+                    )
+            return
+
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        with open(filename, "w") as f:
+            json.dump(config, f)
+
+    def _clear_unfinished(self, trial_id: str) -> None:
+        """
+        Remove everything of the trial but its config
+
+        :param trial_id:
+        :return:
+        """
+
+        for path in Path(self.sweep_dir, trial_id).iterdir():
+            if path.name == Sweep.config_name:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+
+    def _load_result(self, trial_id: str) -> Optional[dict[str, Any]]:
+        filename = os.path.join(self.sweep_dir, trial_id, Sweep.result_name)
+        if not os.path.isfile(filename):
+            return None
+        with open(filename) as f:
+            return json.load(f)
+
+    def run(
+        self,
+        configs: list[dict[str, Any]],
+        n_workers: Optional[int] = None,
+        n_threads: int = 1,
+    ) -> list[dict[str, Any]]:
+        """
+        1.  run every config not yet finished, in a pool of worker-processes
+        2.  write and print the summary of all of them
+
+        :param configs: e.g., of SweepSpace.get_grid() or get_random()
+        :param n_workers: default: cpu-count // n_threads
+        :param n_threads: of torch, per worker
+        :return: the result-row of every trial, best first
+        """
+
+        specs, results = [], []
+        for trial_n, config in enumerate(configs):
+            trial_id = "trial-{0:03}".format(trial_n)
+            self._write_config(trial_id, config)
+
+            result = self._load_result(trial_id)
+            if result is None:
+                self._clear_unfinished(trial_id)
+                specs.append(self._get_spec(trial_id, config))
+            else:
+                results.append(result)
+
+        if specs:
+            n_workers = n_workers or max((os.cpu_count() or 1) // n_threads, 1)
+            n_workers = min(n_workers, len(specs))
+            print(
+                "[SWEEP] {0} trials ({1} finished) on {2} workers".format(
+                    len(configs), len(results), n_workers
+                )
+            )
+            # inherited by every (re-)spawned worker, before it imports torch
+            environ_old = {
+                name: os.environ.get(name)
+                for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS")
+            }
+            os.environ.update({name: str(n_threads) for name in environ_old})
+            try:
+                ctx = multiprocessing.get_context("spawn")
+                with ctx.Pool(
+                    n_workers,
+                    initializer=_init_worker,
+                    initargs=(n_threads,),
+                    maxtasksperchild=1,
+                ) as pool:
+                    for result in pool.imap_unordered(_run_trial, specs):
+                        print(
+                            "[TRIAL] {0} done: best {1}".format(
+                                result["trial_id"], result["score_best"]
+                            )
+                        )
+                        results.append(result)
+            finally:
+                for name, value in environ_old.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+
+        results.sort(
+            key=lambda result: (
+                result["score_best"] is None,
+                -(result["score_best"] or 0.0),
+            )
+        )
+        self.write_summary(results)
+        Sweep.print_summary(results)
+
+        return results
+
+    def write_summary(self, results: list[dict[str, Any]]) -> None:
+        keys = list(dict.fromkeys(key for result in results for key in result))
+        with open(os.path.join(self.sweep_dir, Sweep.summary_name), "w") as f:
+            writer = csv.DictWriter(f, fieldnames=keys)
+            writer.writeheader()
+            writer.writerows(results)
+
+    @staticmethod
+    def print_summary(results: list[dict[str, Any]]) -> None:
+        for result in results:
+            print(
+                "[RESULT] {0}: best {1}, final {2}, {3} cycles{4}, {5:.0f}s | "
+                "{6}".format(
+                    result["trial_id"],
+                    result["score_best"],
+                    result["score_final"],
+                    result["n_cycles"],
+                    " (stopped)" if result["stopped"] else "",
+                    result["time"],
+                    ", ".join(
+                        "{0}={1}".format(key, value)
+                        for key, value in result.items()
+                        if key
+                        not in (
+                            "trial_id",
+                            "n_cycles",
+                            "stopped",
+                            "score_final",
+                            "score_best",
+                            "time",
+                        )
+                    ),
+                )
+            )
+
+
+def sweep_test():
+    from src.rl.result.info import ShetrisInfo
+
+    space = SweepSpace(
+        alg=["ppo", "a2c"],
+        learning_rate=Uniform(1e-5, 1e-3, log=True),
+        gamma=[0.95, 0.99],
+    )
+    sweep = Sweep(
+        ShetrisInfo,
+        "/tmp/shetris_sweep",
+        n_cycles=5,
+        n_steps=2000,
+        stopper=MedianStopper(),
+    )
+    sweep.run(space.get_random(8), n_threads=1)
+
+
+if __name__ == "__main__":
+    pass
+    sweep_test()
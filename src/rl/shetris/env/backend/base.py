@@ -0,0 +1,74 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from typing import Any
+
+import numpy as np
+
+
+class Backend:
+    """
+    The engine-side of the env, i.e., everything that actually plays the game:
+    1.  PRE-phase: place the piece as specified by the action
+    2.  MOVE-phase
+    3.  FREEZE-phase: drop the piece, clear lines, draw the next piece
+
+    NOTE:
+    1.  the env (and its reporter, masker, displayers...) only look at the
+    engine through:
+        1.  engine.field (with .field and .size)
+        2.  engine.pid, engine.size, engine.is_game_over, engine.generator
+        3.  engine.mover.analyzer.get_shifted_range1()
+        4.  engine.reset()
+    ->  any backend's engine must provide these
+
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+    @property
+    def engine(self) -> Any:
+        pass
+
+    def pre_phase(self, action: np.ndarray) -> bool:
+        """
+        Apply the action, correcting it if out of range
+
+        :param action: (rot, pos1)
+        :return: True if correction was applied, False otherwise
+        """
+
+        pass
+
+    def move_phase(self) -> None:
+        pass
+
+    def freeze_phase(self) -> list[np.ndarray]:
+        """
+        Freeze the piece
+
+        :return: the chunks of cleared lines
+        """
+
+        pass
+
+
+if __name__ == "__main__":
+    pass
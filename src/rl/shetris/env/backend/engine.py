@@ -0,0 +1,92 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import numpy as np
+
+from src.engine.engine import Engine
+from src.entry.fetcher.gym import FetcherGym
+from src.entry.stepper.freeze import FreezePhaseGym
+from src.entry.stepper.move import MovePhase
+from src.entry.stepper.pre import PrePhaseGym
+from src.rl.shetris.env.backend.base import Backend
+
+
+class BackendEngine(Backend):
+    """
+    The full engine, stepping through its PRE/MOVE/FREEZE phase-objects:
+    1.  PRE-phase
+        1.  corrected
+    2.  MOVE-phase:
+        1.  ignored
+    3.  FREEZE-phase:
+        1.  include the drop
+
+    """
+
+    def __init__(self, size: tuple[int, int] = (20, 10)):
+        super().__init__()
+
+        self._engine = Engine(size)
+        self._fetcher = FetcherGym
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def fetcher(self):
+        return self._fetcher
+
+    def pre_phase(self, action: np.ndarray) -> bool:
+        """
+        Apply pre_phase:
+        1.  use correction
+        2.  return the correction-result:
+            1.  True if correction was applied
+            2.  False otherwise
+
+        :return:
+        """
+
+        def action_generator():
+            return self.fetcher.get_pre_corrected(self.engine, action)
+
+        return PrePhaseGym.correction_aware(self.engine, action_generator)
+
+    def move_phase(self) -> None:
+        """
+        1.  Use the minimal Move-Phase
+
+        :return:
+        """
+
+        MovePhase.minimal()
+
+    def freeze_phase(self) -> list[np.ndarray]:
+        """
+        1.  Include a drop
+
+        :return:
+        """
+
+        return FreezePhaseGym.with_drop(self.engine)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,419 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from typing import Optional
+
+import numpy as np
+
+from src.rl.shetris.env.backend.base import Backend
+from src.rl.shetris.env.masker import ActionMasker
+from src.rl.shetris.env.tape import PieceTape, GeneratorTape
+
+
+class PieceShapes:
+    """
+    The cells of every (pid, rot), cropped to their bounding-box:
+    1.  pid as in the engine: O, I, S, Z, J, L, T
+    2.  rot in clockwise order, starting from the spawn-orientation
+    3.  pieces with fewer distinct rotations repeat their shapes
+
+    Thus, pos1 is the column of the left edge of the bounding-box, and the
+    shifted range of pos1 is simply [0, width - piece-width]
+
+    """
+
+    _shapes_raw = (
+        (((1, 1), (1, 1)),),
+        (((1, 1, 1, 1),), ((1,), (1,), (1,), (1,))),
+        (((0, 1, 1), (1, 1, 0)), ((1, 0), (1, 1), (0, 1))),
+        (((1, 1, 0), (0, 1, 1)), ((0, 1), (1, 1), (1, 0))),
+        (
+            ((1, 0, 0), (1, 1, 1)),
+            ((1, 1), (1, 0), (1, 0)),
+            ((1, 1, 1), (0, 0, 1)),
+            ((0, 1), (0, 1), (1, 1)),
+        ),
+        (
+            ((0, 0, 1), (1, 1, 1)),
+            ((1, 0), (1, 0), (1, 1)),
+            ((1, 1, 1), (1, 0, 0)),
+            ((1, 1), (0, 1), (0, 1)),
+        ),
+        (
+            ((0, 1, 0), (1, 1, 1)),
+            ((1, 0), (1, 1), (1, 0)),
+            ((1, 1, 1), (0, 1, 0)),
+            ((0, 1), (1, 1), (0, 1)),
+        ),
+    )
+
+    shapes: list[list[np.ndarray]] = [
+        [
+            np.array(shapes[rot % len(shapes)], dtype=bool)
+            for rot in range(ActionMasker.n_rot_max)
+        ]
+        for shapes in _shapes_raw
+    ]
+
+    @staticmethod
+    def get_bottoms(shape: np.ndarray) -> np.ndarray:
+        """
+        Offset (from the top of the bounding-box) of the lowest cell of every
+        column of the piece
+
+        :param shape:
+        :return:
+        """
+
+        return shape.shape[0] - 1 - np.argmax(shape[::-1, :], axis=0)
+
+
+class FieldPlacement:
+    """
+    Bare field:
+    1.  the matrix, row 0 at the top
+    2.  the size
+
+    """
+
+    def __init__(self, size: tuple[int, int]):
+        self.size = size
+        self.field = np.zeros(size, dtype=bool)
+
+
+class AnalyzerPlacement:
+    def __init__(self, width: int):
+        self._width = width
+
+    def get_shifted_range1(self, pid: int, rot: int) -> tuple[int, int]:
+        return 0, self._width - PieceShapes.shapes[pid][rot].shape[1]
+
+
+class MoverPlacement:
+    def __init__(self, width: int):
+        self.analyzer = AnalyzerPlacement(width)
+
+
+class EnginePlacement:
+    """
+    Placement-only engine:
+    1.  PRE: correct the action, find the landing row with one hard-drop
+    2.  FREEZE: write the piece, clear lines, draw the next piece
+
+    NOTE:
+    1.  without a tape installed, draws from a freshly (randomly) seeded tape
+
+    """
+
+    def __init__(self, size: tuple[int, int] = (20, 10)):
+        self._size = size
+        self.field = FieldPlacement(size)
+        self.mover = MoverPlacement(size[1])
+        self.generator = GeneratorTape(
+            PieceTape.from_seed(int(np.random.SeedSequence().generate_state(1)[0]))
+        )
+
+        self.pid = 0
+        self.is_game_over = False
+        self._rot, self._pos1, self._row = 0, 0, 0
+
+    @property
+    def size(self):
+        return self._size
+
+    def reset(self) -> None:
+        self.field.field[:] = False
+        self.is_game_over = False
+        self.pid = self.generator.get_pid()
+
+    def set_state(self, field: np.ndarray, pid: int) -> None:
+        """
+        Jump to some state, e.g., a keyframe of a recorded game:
+        1.  the field
+        2.  the current piece
+
+        NOTE:
+        1.  the position on the tape is up to the caller
+
+        :param field:
+        :param pid:
+        :return:
+        """
+
+        np.copyto(self.field.field, field)
+        self.pid = pid
+        self.is_game_over = False
+
+    def _correct(self, rot: int, pos1: int) -> tuple[int, int, bool]:
+        """
+        1.  fold the rotation onto the distinct rotations of the piece
+        2.  clip pos1 into the shifted range
+
+        :param rot:
+        :param pos1:
+        :return: the corrected (rot, pos1), True if out of range
+        """
+
+        pos1_min, pos1_max = self.mover.analyzer.get_shifted_range1(
+            self.pid, rot % ActionMasker.n_rot_max
+        )
+        corrected = not (0 <= rot < ActionMasker.n_rot_max) or not (
+            pos1_min <= pos1 <= pos1_max
+        )
+
+        rot %= ActionMasker.pid_to_n_rot[self.pid]
+        pos1 = min(max(pos1, pos1_min), pos1_max)
+
+        return rot, pos1, corrected
+
+    def get_landing_row(self, rot: int, pos1: int) -> int:
+        """
+        Row (of the bounding-box's top) after a hard-drop from the very top:
+        1.  per column, the piece's lowest cell stops just above the column's
+        highest filled cell
+        2.  the piece stops at the first column that blocks
+
+        NOTE:
+        1.  negative iff the piece cannot even be placed at the top
+
+        :param rot:
+        :param pos1:
+        :return:
+        """
+
+        shape = PieceShapes.shapes[self.pid][rot]
+        cols = self.field.field[:, pos1 : pos1 + shape.shape[1]]
+
+        tops = np.where(cols.any(axis=0), cols.argmax(axis=0), self._size[0])
+        return int(np.min(tops - 1 - PieceShapes.get_bottoms(shape)))
+
+    def pre(self, action: np.ndarray) -> bool:
+        rot, pos1, corrected = self._correct(int(action[0]), int(action[1]))
+
+        row = self.get_landing_row(rot, pos1)
+        if row < 0:
+            self.is_game_over = True
+
+        self._rot, self._pos1, self._row = rot, pos1, row
+        return corrected
+
+    def _lineclear(self, rows: slice) -> list[np.ndarray]:
+        """
+        Clear the full lines within the rows, i.e., where the piece has landed
+
+        :param rows:
+        :return: chunks of consecutive cleared lines
+        """
+
+        field = self.field.field
+
+        idx_full = np.flatnonzero(field[rows].all(axis=1)) + rows.start
+        if idx_full.size == 0:
+            return []
+
+        remaining = np.delete(field[: rows.stop], idx_full, axis=0)
+        field[: idx_full.size] = False
+        field[idx_full.size : rows.stop] = remaining
+
+        return np.split(idx_full, np.flatnonzero(np.diff(idx_full) != 1) + 1)
+
+    def freeze(self) -> list[np.ndarray]:
+        shape = PieceShapes.shapes[self.pid][self._rot]
+        height, width = shape.shape
+        rows = slice(self._row, self._row + height)
+
+        self.field.field[rows, self._pos1 : self._pos1 + width] |= shape
+        line_chunks = self._lineclear(rows)
+
+        self.pid = self.generator.get_pid()
+        return line_chunks
+
+
+class BackendPlacement(Backend):
+    """
+    Skip the engine's phase-objects altogether:
+    1.  PRE-phase: hard-drop straight to the landing row
+    2.  MOVE-phase: nothing
+    3.  FREEZE-phase: write, clear lines, draw the next piece
+
+    """
+
+    def __init__(
+        self, size: tuple[int, int] = (20, 10), engine: Optional[EnginePlacement] = None
+    ):
+        super().__init__()
+
+        self._engine = EnginePlacement(size) if engine is None else engine
+
+    @property
+    def engine(self):
+        return self._engine
+
+    def pre_phase(self, action: np.ndarray) -> bool:
+        return self._engine.pre(action)
+
+    def move_phase(self) -> None:
+        pass
+
+    def freeze_phase(self) -> list[np.ndarray]:
+        return self._engine.freeze()
+
+
+class BackendEquivalence:
+    """
+    Check that the placement-backend reproduces the engine, step by step:
+    1.  every game on its own seeded tape, the same for both backends
+    2.  the same (random, including out-of-range) actions for both backends
+    3.  after every step, compare: field, pid, reward, done, corrected,
+    n_pieces, n_lines
+
+    NOTE:
+    1.  the piece-table, pos1, the spawn and the game-over rule of
+    EnginePlacement are written by hand: until this check passes on the actual
+    engine, do not use the placement-backend in place of the engine
+
+    """
+
+    def __init__(self, size: tuple[int, int] = (20, 10)):
+        self._size = size
+
+    @staticmethod
+    def _get_state(env, reward: float, done: bool, __: dict) -> tuple:
+        return (
+            np.copy(env.engine.field.field),
+            int(env.engine.pid),
+            float(reward),
+            bool(done),
+            int(env.n_corrected),
+            int(env.n_pieces),
+            int(env.n_lines),
+        )
+
+    @staticmethod
+    def _is_equal(state_a: tuple, state_b: tuple) -> bool:
+        return np.array_equal(state_a[0], state_b[0]) and state_a[1:] == state_b[1:]
+
+    def check_game(self, seed: int, max_steps: int = 1000) -> Optional[int]:
+        """
+        :param seed: of the tape and of the actions
+        :param max_steps:
+        :return: the first step that differs, None if the game is identical
+        """
+
+        from src.rl.shetris.env.backend.engine import BackendEngine
+        from src.rl.shetris.env.shenv import ShetrisEnv
+
+        envs = [
+            ShetrisEnv(backend=backend, displayer=[], use_np=True)
+            for backend in (BackendEngine(self._size), BackendPlacement(self._size))
+        ]
+        for env in envs:
+            env.reset(seed=seed)
+
+        rng = np.random.default_rng(seed)
+        for step in range(max_steps):
+            action = np.array(
+                (
+                    rng.integers(0, ActionMasker.n_rot_max + 1),
+                    rng.integers(-1, self._size[1] + 1),
+                )
+            )
+            state_engine, state_placement = (
+                BackendEquivalence._get_state(env, *env.step(action)[1:])
+                for env in envs
+            )
+            if not BackendEquivalence._is_equal(state_engine, state_placement):
+                return step
+            if state_engine[3]:
+                return None
+
+        return None
+
+    def check(self, n_games: int = 100, seed: int = 147) -> bool:
+        """
+        :param n_games: every game on its own seed, derived from the seed
+        :param seed:
+        :return: if every game is identical
+        """
+
+        seeds = np.random.SeedSequence(seed).generate_state(n_games)
+        n_differing = 0
+        for seed_game in seeds:
+            step = self.check_game(int(seed_game))
+            if step is not None:
+                n_differing += 1
+                print(
+                    "[DIFFERENT] game of seed {0}, from step {1}".format(
+                        seed_game, step
+                    )
+                )
+
+        print(
+            "[EQUIVALENCE] {0}/{1} games identical".format(
+                n_games - n_differing, n_games
+            )
+        )
+        return n_differing == 0
+
+
+def compare_backends_test(seed: int = 147, n_steps: int = 2000):
+    """
+    1.  check that the trajectories of both backends are identical
+    2.  only then: time both, on the same actions and tape
+
+    :param seed:
+    :param n_steps:
+    :return:
+    """
+
+    import time
+
+    from src.rl.shetris.env.backend.engine import BackendEngine
+    from src.rl.shetris.env.shenv import ShetrisEnv
+
+    if not BackendEquivalence().check(seed=seed):
+        return
+
+    rng = np.random.default_rng(seed)
+    actions = np.stack(
+        (rng.integers(0, 4, n_steps), rng.integers(0, 10, n_steps)), axis=1
+    )
+
+    times = []
+    for backend in (BackendEngine(), BackendPlacement()):
+        env = ShetrisEnv(backend=backend, displayer=[])
+        env.reset(seed=seed)
+
+        time_start = time.perf_counter()
+        for action in actions:
+            __, __, done, __ = env.step(action)
+            if done:
+                env.reset()
+        times.append(time.perf_counter() - time_start)
+
+    print(
+        "[TIME] engine {0:.3f}s | placement {1:.3f}s | speedup {2:.1f}x".format(
+            times[0], times[1], times[0] / times[1]
+        )
+    )
+
+
+if __name__ == "__main__":
+    pass
+    compare_backends_test()
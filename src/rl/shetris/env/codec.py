@@ -0,0 +1,45 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import numpy as np
+
+
+class FieldCodec:
+    """
+    Bit-pack boolean fields:
+    1.  one bit per cell, e.g., 25 bytes for the standard 20*10 field
+    2.  the size is not stored; the caller must keep it
+
+    """
+
+    @staticmethod
+    def get_n_bytes(size: tuple[int, int]) -> int:
+        return -(-size[0] * size[1] // 8)
+
+    @staticmethod
+    def pack(field: np.ndarray) -> np.ndarray:
+        return np.packbits(field.ravel())
+
+    @staticmethod
+    def unpack(packed: np.ndarray, size: tuple[int, int]) -> np.ndarray:
+        return np.unpackbits(packed, count=size[0] * size[1]).reshape(size).astype(bool)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,144 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import numpy as np
+
+
+class RendererRgb:
+    """
+    Render fields to RGB-frames with NumPy only, e.g., for recording videos
+    without a display-server:
+    1.  palette-lookup: cell-value -> color
+        ->  0 is empty; a boolean field uses the color of 1
+    2.  scale every cell to cell_px * cell_px pixels
+
+    NOTE:
+    1.  the returned frame is a buffer reused by the next call
+    ->  copy it if it must outlive the next render
+
+    """
+
+    palette = np.array(
+        (
+            (30, 30, 30),
+            (74, 144, 217),
+            (0, 240, 240),
+            (0, 240, 0),
+            (240, 0, 0),
+            (0, 0, 240),
+            (240, 160, 0),
+            (160, 0, 240),
+        ),
+        dtype=np.uint8,
+    )
+
+    def __init__(self, size: tuple[int, int], cell_px: int = 8):
+        self._size = size
+        self._cell_px = cell_px
+
+        self._cells, self._rows, self._frame = self._get_buffers(())
+        self._cells_batch, self._rows_batch, self._frames_batch = self._get_buffers(
+            (0,)
+        )
+
+    def get_frame_shape(self) -> tuple[int, int, int]:
+        return self._size[0] * self._cell_px, self._size[1] * self._cell_px, 3
+
+    def _get_buffers(self, shape_lead: tuple) -> tuple[np.ndarray, ...]:
+        """
+        The buffers of (a batch of) frames:
+        1.  cells: the color of every cell
+        2.  rows: every cell scaled horizontally
+        3.  frames: every row then scaled vertically
+
+        :param shape_lead:
+        :return:
+        """
+
+        height, width = self._size
+        return (
+            np.empty((*shape_lead, height, width, 3), dtype=np.uint8),
+            np.empty((*shape_lead, height, width * self._cell_px, 3), dtype=np.uint8),
+            np.empty((*shape_lead, *self.get_frame_shape()), dtype=np.uint8),
+        )
+
+    def _scale(self, cells: np.ndarray, rows: np.ndarray, frames: np.ndarray):
+        """
+        Write every cell's color into its cell_px * cell_px block of the frame:
+        1.  the broadcasting equivalent of repeat() along both axes, but into the
+        reused buffers
+        2.  horizontally first, such that the vertical scaling only copies whole
+        contiguous rows
+
+        :param cells: (..., height, width, 3)
+        :param rows: (..., height, width * cell_px, 3)
+        :param frames: (..., height * cell_px, width * cell_px, 3)
+        :return:
+        """
+
+        height, width = self._size
+        px = self._cell_px
+        shape_lead = cells.shape[:-3]
+        len_row = width * px * 3
+
+        rows.reshape(*shape_lead, height, width, px, 3)[...] = cells[..., None, :]
+        frames.reshape(*shape_lead, height, px, len_row)[...] = rows.reshape(
+            *shape_lead, height, 1, len_row
+        )
+
+    def render(self, field: np.ndarray) -> np.ndarray:
+        np.take(
+            RendererRgb.palette,
+            field.astype(np.intp, copy=False),
+            axis=0,
+            out=self._cells,
+        )
+        self._scale(self._cells, self._rows, self._frame)
+
+        return self._frame
+
+    def render_batch(self, fields: np.ndarray) -> np.ndarray:
+        """
+        Render the fields of many envs at once, e.g., of a vectorized env
+
+        :param fields: (n_envs, height, width)
+        :return: (n_envs, height * cell_px, width * cell_px, 3)
+        """
+
+        n_envs = fields.shape[0]
+        if self._frames_batch.shape[0] != n_envs:
+            (
+                self._cells_batch,
+                self._rows_batch,
+                self._frames_batch,
+            ) = self._get_buffers((n_envs,))
+
+        np.take(
+            RendererRgb.palette,
+            fields.astype(np.intp, copy=False),
+            axis=0,
+            out=self._cells_batch,
+        )
+        self._scale(self._cells_batch, self._rows_batch, self._frames_batch)
+
+        return self._frames_batch
+
+
+if __name__ == "__main__":
+    pass
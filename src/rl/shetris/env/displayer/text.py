@@ -17,6 +17,13 @@
 #
 
 
+import os
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+
 from src.engine.engine import Engine
 from src.rl.shetris.env.displayer.base import Displayer
 
@@ -35,3 +42,116 @@ class DisplayerText(Displayer):
         # print("PID-Reservoir", self._engine.generator.reservoir.data)
 
         DisplayerText._display_scores(n_pieces, n_lines)
+
+
+class DisplayerTextAnsi(Displayer):
+    """
+    Draw the field in the terminal, cheaply:
+    1.  ANSI cursor-control: only the cells that changed since the last frame
+    are redrawn
+    2.  the whole frame is buffered and written with one write()
+    3.  rate-limited: frames arriving faster than fps_max are dropped
+    ->  the next drawn frame still catches up on all changes in between
+    ->  the game-over frame is always drawn, as no frame might follow
+
+    """
+
+    _cell_filled, _cell_empty = "[]", " ."
+
+    def __init__(self, engine: Engine, fps_max: float = 30.0, fd: Optional[int] = None):
+        super().__init__(engine)
+
+        self._fd = sys.stdout.fileno() if fd is None else fd
+        self._interval_min = 1 / fps_max
+        self._time_last = -np.inf
+
+        self._field_prev: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _goto(row: int, col: int) -> str:
+        """
+        Cursor-position of a cell, 1-indexed as ANSI expects; every cell is two
+        characters wide
+
+        :param row:
+        :param col:
+        :return:
+        """
+
+        return "\x1b[{0};{1}H".format(row + 1, 2 * col + 1)
+
+    def _get_cell(self, filled: bool) -> str:
+        return self._cell_filled if filled else self._cell_empty
+
+    def _draw_full(self, field: np.ndarray) -> list[str]:
+        """
+        Clear the screen and draw every cell
+
+        :param field:
+        :return:
+        """
+
+        frame = ["\x1b[2J"]
+        for row, line in enumerate(field):
+            frame.append(DisplayerTextAnsi._goto(row, 0))
+            frame.extend(self._get_cell(filled) for filled in line)
+
+        return frame
+
+    def _draw_diff(self, field: np.ndarray) -> list[str]:
+        """
+        Redraw only the cells that changed since the last drawn frame
+
+        :param field:
+        :return:
+        """
+
+        frame = []
+        for row, col in np.argwhere(field != self._field_prev):
+            frame.append(DisplayerTextAnsi._goto(row, col))
+            frame.append(self._get_cell(field[row, col]))
+
+        return frame
+
+    def _write(self, frame: str) -> None:
+        data = frame.encode()
+        while data:
+            data = data[os.write(self._fd, data) :]
+
+    def display(self, n_pieces: int, n_lines: int, force: bool = False):
+        """
+        Draw the frame, unless the previous one was drawn too recently (and the
+        game is still on)
+
+        :param n_pieces:
+        :param n_lines:
+        :param force: draw regardless of the rate-limit
+        :return:
+        """
+
+        force = force or self._engine.is_game_over
+        time_now = time.monotonic()
+        if not force and time_now - self._time_last < self._interval_min:
+            return
+        self._time_last = time_now
+
+        field = self._engine.field.field
+        if self._field_prev is None or self._field_prev.shape != field.shape:
+            frame = self._draw_full(field)
+            self._field_prev = np.copy(field)
+        else:
+            frame = self._draw_diff(field)
+            np.copyto(self._field_prev, field)
+
+        frame.append(DisplayerTextAnsi._goto(field.shape[0], 0))
+        frame.append("\x1b[2KTOTAL PIECES {0} @ {1} LINES".format(n_pieces, n_lines))
+        self._write("".join(frame))
+
+    def reset(self) -> None:
+        """
+        Force a full redraw on the next frame
+
+        :return:
+        """
+
+        self._field_prev = None
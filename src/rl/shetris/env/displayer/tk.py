@@ -17,68 +17,197 @@
 #
 
 
+import queue
+import threading
 import tkinter
+from typing import Optional
 
 import numpy as np
 
 from src.engine.engine import Engine
-from src.front.fronttk import FieldTK
+from src.rl.shetris.env.backend.engine import BackendEngine
 from src.rl.shetris.env.displayer.base import Displayer
-
 from src.rl.shetris.env.shenv import ShetrisEnv
 
 
+class FieldCanvas:
+    """
+    The field as a canvas of one rectangle per cell:
+    1.  remember what is currently shown
+    2.  on update, re-color only the cells that changed
+
+    """
+
+    _color_filled, _color_empty = "#4a90d9", "#1e1e1e"
+
+    def __init__(self, root: tkinter.Misc, size: tuple[int, int], cell_px: int = 24):
+        height, width = size
+
+        self._canvas = tkinter.Canvas(
+            root,
+            width=width * cell_px,
+            height=height * cell_px,
+            bg=FieldCanvas._color_empty,
+            highlightthickness=0,
+        )
+        self._canvas.pack()
+
+        self._cells = np.array(
+            [
+                [
+                    self._canvas.create_rectangle(
+                        col * cell_px,
+                        row * cell_px,
+                        (col + 1) * cell_px - 1,
+                        (row + 1) * cell_px - 1,
+                        fill=FieldCanvas._color_empty,
+                        outline="",
+                    )
+                    for col in range(width)
+                ]
+                for row in range(height)
+            ]
+        )
+        self._field_shown = np.zeros(size, dtype=bool)
+
+    def set_from_matrix(self, field: np.ndarray) -> None:
+        """
+        Push only the changed cells to the canvas
+
+        :param field:
+        :return:
+        """
+
+        for row, col in np.argwhere(field != self._field_shown):
+            self._canvas.itemconfigure(
+                self._cells[row, col],
+                fill=(
+                    FieldCanvas._color_filled
+                    if field[row, col]
+                    else FieldCanvas._color_empty
+                ),
+            )
+        np.copyto(self._field_shown, field)
+
+
+class DisplayerTk(Displayer):
+    """
+    Hand the frames over to the GUI:
+    1.  called from the agent's (worker-)thread, thus never touches Tk itself
+    2.  keeps at most the latest few frames: if the GUI lags behind, older
+    frames are dropped
+
+    """
+
+    def __init__(self, engine: Engine, frames: queue.Queue):
+        super().__init__(engine)
+
+        self._frames = frames
+
+    def display(self, n_pieces: int = 0, n_lines: int = 0, **kwargs):
+        frame = np.copy(self._engine.field.field), n_pieces, n_lines
+
+        try:
+            self._frames.put_nowait(frame)
+        except queue.Full:
+            try:
+                self._frames.get_nowait()
+            except queue.Empty:
+                pass
+            self._frames.put_nowait(frame)
+
+
 class EntryTk:
-    root = tkinter.Tk()
+    """
+    GUI for watching the agent play:
+    1.  Tk only lives in the main thread; it is created here, not on import
+    2.  the agent plays on a worker thread, sending frames through a queue
+    3.  the main thread polls the queue and draws the latest frame
+
+    """
+
+    def __init__(self, size: tuple[int, int] = (20, 10), poll_ms: int = 15):
+        self.root = tkinter.Tk()
+        self._poll_ms = poll_ms
+
+        self._frames = queue.Queue(maxsize=2)
+        self._field = FieldCanvas(self.root, size)
+        self._score = tkinter.Label(self.root, text="")
+        self._score.pack()
+
+        backend = BackendEngine(size)
+        self.env = ShetrisEnv(
+            backend=backend, displayer=[DisplayerTk(backend.engine, self._frames)]
+        )
+        self._worker: Optional[threading.Thread] = None
 
-    def __init__(self, size: tuple[int, int] = (20, 10)):
-        self.env = ShetrisEnv(size)
         self._setups_tk()
 
     def _setups_tk(self) -> None:
         """
         All the setups necessary for Tk:
         1.  Perform all the key-binds
-        2.  Set the correct default focus (on the game-frontend)
+        2.  Start polling for frames
         3.  Start the main-loop of Tk
 
         :return:
         """
 
-        EntryTk.root.bind("<space>", self._init)
-        EntryTk.root.bind("<Return>", self._play_agent)
+        self.root.bind("<space>", self._init)
+        self.root.bind("<Return>", self._play_agent)
+
+        self.root.title("Shetris")
+        self.root.after(self._poll_ms, self._poll)
+        self.root.mainloop()
+
+    def _poll(self) -> None:
+        """
+        Draw the latest frame (if any), then poll again
+
+        :return:
+        """
+
+        frame = None
+        while True:
+            try:
+                frame = self._frames.get_nowait()
+            except queue.Empty:
+                break
 
-        EntryTk.root.title("Shetris")
-        EntryTk.root.mainloop()
+        if frame is not None:
+            field, n_pieces, n_lines = frame
+            self._field.set_from_matrix(field)
+            self._score.configure(
+                text="TOTAL PIECES {0} @ {1} LINES".format(n_pieces, n_lines)
+            )
+
+        self.root.after(self._poll_ms, self._poll)
 
     def _init(self, __):
-        self.env.render()
+        if self._worker is None or not self._worker.is_alive():
+            self.env.render()
 
-    def _play_agent(self, __):
+    def _run_agent(self) -> None:
         from src.rl.util.gym.runner import RunnerGym
 
         r_ins = RunnerGym(self.env)
         r_ins.run_reset()
         r_ins.run_episodes_random(2)
 
+    def _play_agent(self, __):
+        """
+        Start the agent on a worker-thread, unless it is already playing
 
-class DisplayerTk(Displayer):
-    """
-    Put all the GUI-components here:
-    1.  the field
-    2.  the score
-    3.  the preview
-    4.  the PRE-area
-
-    """
+        :return:
+        """
 
-    def __init__(self, engine: Engine, root):
-        super().__init__(engine)
+        if self._worker is not None and self._worker.is_alive():
+            return
 
-        self._field = FieldTK(root, self._engine.size)
+        self._worker = threading.Thread(target=self._run_agent, daemon=True)
+        self._worker.start()
 
-    def display_field(self, field: np.ndarray):
-        self._field.set_from_matrix(field)
 
-    def display(self, field: np.ndarray):
-        self.display_field(field)
+if __name__ == "__main__":
+    pass
+    EntryTk()
@@ -0,0 +1,129 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import gym
+import numpy as np
+
+from src.engine.engine import Engine
+
+
+class ActionMasker:
+    """
+    Find the legal actions of the flattened action-space:
+    1.  layout as in the env: action = rot * width + pos1
+    2.  legal:
+        1.  pos1 within the shifted range of (pid, rot)
+        2.  rot is canonical: symmetric pieces have fewer distinct rotations,
+        ->  e.g., rot 2 of the I-piece is the same placement as its rot 0
+
+    NOTE:
+    1.  the legal range only depends on (pid, rot), not on the field
+    ->  masks are built once per pid and cached
+
+    """
+
+    _pid = list(range(7))
+    _n_rot = [1] + [2] * 3 + [4] * 3
+    pid_to_n_rot = dict(zip(_pid, _n_rot))
+    n_rot_max = 4
+
+    def __init__(self, engine: Engine):
+        self._engine = engine
+        self._width = self._engine.field.size[1]
+
+        self._pid_to_mask: dict[int, np.ndarray] = {}
+
+    @property
+    def n_actions(self):
+        return ActionMasker.n_rot_max * self._width
+
+    def _build_mask(self, pid: int) -> np.ndarray:
+        """
+        Build the (read-only) mask of one pid
+
+        :param pid:
+        :return:
+        """
+
+        mask = np.zeros((ActionMasker.n_rot_max, self._width), dtype=bool)
+        for rot in range(ActionMasker.pid_to_n_rot[pid]):
+            pos1_min, pos1_max = self._engine.mover.analyzer.get_shifted_range1(
+                pid, rot
+            )
+            mask[rot, pos1_min : pos1_max + 1] = True
+
+        mask = mask.ravel()
+        mask.setflags(write=False)
+        return mask
+
+    def get_mask(self) -> np.ndarray:
+        """
+        Legal-action mask of the current piece
+
+        :return:
+        """
+
+        pid = self._engine.pid
+        if pid not in self._pid_to_mask:
+            self._pid_to_mask[pid] = self._build_mask(pid)
+
+        return self._pid_to_mask[pid]
+
+    def get_action_canonical(self, action: int) -> int:
+        """
+        Map an action to the canonical action of the same placement:
+        1.  fold the rotation onto the distinct rotations of the current piece
+        2.  keep pos1
+
+        :param action:
+        :return:
+        """
+
+        rot, pos1 = divmod(int(action), self._width)
+        rot %= ActionMasker.pid_to_n_rot[self._engine.pid]
+
+        return rot * self._width + pos1
+
+
+class ActionMaskWrapper(gym.Wrapper):
+    """
+    Wrapper for maskable policies, e.g., sb3-contrib's MaskablePPO:
+    1.  expose action_masks()
+    2.  canonicalize actions before passing them on
+
+    NOTE:
+    1.  requires the env to use the flattened action-space
+
+    """
+
+    def __init__(self, env: gym.Env):
+        super().__init__(env)
+
+        if not isinstance(self.action_space, gym.spaces.Discrete):
+            raise ValueError("action-masking requires the flattened action-space")
+
+    def action_masks(self) -> np.ndarray:
+        return self.env.action_masks()
+
+    def step(self, action: int):
+        return self.env.step(self.env.masker.get_action_canonical(action))
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,120 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import time
+from typing import Any, Callable
+
+
+class StepProfiler:
+    """
+    Accumulate the wall-time spent in every phase of the env's step:
+    1.  PRE, MOVE, FREEZE: the engine
+    2.  report: observation, reward and info (i.e., the analysis)
+    3.  render: the displayers
+
+    and the number of corrected (i.e., wasted) actions
+
+    NOTE:
+    1.  totals are kept across episodes until reset() is called
+    2.  the env only holds a profiler if profiling is requested
+    ->  without one, each phase costs one extra function-call at most
+
+    """
+
+    phases = ("pre", "move", "freeze", "report", "render")
+
+    def __init__(self):
+        self._time_totals = dict.fromkeys(StepProfiler.phases, 0.0)
+        self._n_calls = dict.fromkeys(StepProfiler.phases, 0)
+        self._n_steps, self._n_corrected = 0, 0
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def timed(self, phase: str, func: Callable, *args) -> Any:
+        """
+        Run the function, booking its time to the phase
+
+        :param phase:
+        :param func:
+        :param args:
+        :return:
+        """
+
+        time_start = time.perf_counter()
+        result = func(*args)
+        self._time_totals[phase] += time.perf_counter() - time_start
+        self._n_calls[phase] += 1
+
+        return result
+
+    def count_step(self, corrected: bool) -> None:
+        self._n_steps += 1
+        self._n_corrected += corrected
+
+    def get_summary(self) -> dict[str, Any]:
+        """
+        Aggregates:
+        1.  per phase: total time, number of calls, mean time per call
+        2.  share of the total time of all phases
+        3.  number of steps, of corrected actions and their ratio
+
+        :return:
+        """
+
+        time_all = sum(self._time_totals.values())
+
+        summary = {}
+        for phase in StepProfiler.phases:
+            time_total, n_calls = self._time_totals[phase], self._n_calls[phase]
+            summary[phase] = {
+                "time_total": time_total,
+                "n_calls": n_calls,
+                "time_mean": time_total / n_calls if n_calls else 0.0,
+                "share": time_total / time_all if time_all else 0.0,
+            }
+
+        summary["n_steps"] = self._n_steps
+        summary["n_corrected"] = self._n_corrected
+        summary["ratio_corrected"] = (
+            self._n_corrected / self._n_steps if self._n_steps else 0.0
+        )
+
+        return summary
+
+    def print_summary(self) -> None:
+        summary = self.get_summary()
+        for phase in StepProfiler.phases:
+            print(
+                "[{0:>6}] {1:.3f}s over {2} calls ({3:.1%})".format(
+                    phase,
+                    summary[phase]["time_total"],
+                    summary[phase]["n_calls"],
+                    summary[phase]["share"],
+                )
+            )
+        print(
+            "[CORRECTED] {0} of {1} steps ({2:.1%})".format(
+                summary["n_corrected"], summary["n_steps"], summary["ratio_corrected"]
+            )
+        )
+
+
+if __name__ == "__main__":
+    pass
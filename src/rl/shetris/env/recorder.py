@@ -0,0 +1,146 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from typing import Any
+
+import numpy as np
+
+from src.rl.shetris.env.codec import FieldCodec
+
+
+class EpisodeRecorder:
+    """
+    Record an episode compactly, such that it can be re-simulated:
+    1.  the piece-tape
+    2.  every action, as the raw (rot, pos1) pair of int16
+    ->  also the out-of-space actions the env corrects, and for any width
+    3.  a keyframe every keyframe_interval steps (and right after reset):
+        1.  the field, bit-packed
+        2.  meta: step, tape-cursor, pid, n_pieces, n_lines, n_corrected
+    4.  the backend, and the tape-cursor before the reset: the episode can be
+    re-simulated from its very start on the same backend
+
+    NOTE:
+    1.  requires the env to play from a tape, i.e., seed it or pass a tape
+    2.  holds the latest episode only; save() it before the next reset()
+
+    """
+
+    # step, tape-cursor, pid, n_pieces, n_lines, n_corrected
+    n_meta = 6
+
+    def __init__(self, keyframe_interval: int = 100):
+        self._keyframe_interval = keyframe_interval
+
+        self._size = (0, 0)
+        self._backend_name, self._cursor_start = "", 0
+        self._pids, self._seed = np.empty((0,), dtype=np.uint8), -1
+        self._actions: list[tuple[int, int]] = []
+        self._keyframes: list[np.ndarray] = []
+        self._keyframes_meta: list[tuple] = []
+
+    @property
+    def n_steps(self):
+        return len(self._actions)
+
+    def start(self, env: Any, cursor_start: int) -> None:
+        """
+        Start recording a new episode, called by the env on reset()
+
+        :param env:
+        :param cursor_start: of the tape, before the engine's reset
+        :return:
+        """
+
+        if env.tape is None:
+            raise ValueError("recording requires a tape: seed the env or pass one")
+
+        self._size = env.engine.field.size
+        self._backend_name = type(env.backend).__name__
+        self._cursor_start = cursor_start
+        self._actions.clear()
+        self._keyframes.clear()
+        self._keyframes_meta.clear()
+        self._record_keyframe(env)
+
+    def _record_keyframe(self, env: Any) -> None:
+        self._keyframes.append(FieldCodec.pack(env.engine.field.field))
+        self._keyframes_meta.append(
+            (
+                self.n_steps,
+                env.tape.cursor,
+                env.engine.pid,
+                env.n_pieces,
+                env.n_lines,
+                env.n_corrected,
+            )
+        )
+
+    def record(self, action: int | np.ndarray, env: Any) -> None:
+        """
+        Record one step, called by the env after every step()
+
+        :param action: either flattened or (rot, pos1)
+        :param env:
+        :return:
+        """
+
+        if np.ndim(action) == 0:
+            rot, pos1 = divmod(int(action), self._size[1])
+        else:
+            rot, pos1 = int(action[0]), int(action[1])
+        limits = np.iinfo(np.int16)
+        if not (limits.min <= rot <= limits.max and limits.min <= pos1 <= limits.max):
+            raise ValueError("action beyond int16: {0}".format((rot, pos1)))
+        self._actions.append((rot, pos1))
+
+        if self.n_steps % self._keyframe_interval == 0:
+            self._record_keyframe(env)
+
+    def save(self, filename: str, env: Any) -> None:
+        """
+        Write the episode:
+        1.  the keyframe of the final state is always included
+        2.  the whole tape as generated so far (thus, including any preview)
+
+        :param filename:
+        :param env:
+        :return:
+        """
+
+        if self._keyframes_meta[-1][0] != self.n_steps:
+            self._record_keyframe(env)
+
+        np.savez_compressed(
+            filename,
+            size=np.array(self._size, dtype=np.int64),
+            backend=np.array(self._backend_name),
+            cursor_start=np.array(self._cursor_start, dtype=np.int64),
+            pids=env.tape.pids,
+            seed=np.array(-1 if env.tape.seed is None else env.tape.seed),
+            n_bags_block=np.array(env.tape.n_bags_block, dtype=np.int64),
+            n_blocks=np.array(env.tape.n_blocks, dtype=np.int64),
+            actions=np.array(self._actions, dtype=np.int16).reshape(-1, 2),
+            keyframes=np.stack(self._keyframes),
+            keyframes_meta=np.array(self._keyframes_meta, dtype=np.int64),
+        )
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,220 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+import numpy as np
+
+from src.rl.shetris.env.backend.engine import BackendEngine
+from src.rl.shetris.env.backend.placement import BackendPlacement
+from src.rl.shetris.env.codec import FieldCodec
+from src.rl.shetris.env.shenv import ShetrisEnv
+from src.rl.shetris.env.tape import PieceTape
+
+
+class EpisodeReplayer:
+    """
+    Re-simulate a recorded episode, headless and at full speed:
+    1.  replay(): all steps from the episode's start, checking every keyframe
+    along the way
+    2.  seek(): jump to any step through the nearest keyframe before it
+
+    NOTE:
+    1.  re-simulates on the backend of the recording: the placement-backend
+    is not proven to reproduce the engine (see BackendEquivalence)
+    2.  jumping to a keyframe needs engine.set_state(); without it (or for
+    recordings without the episode's start), seek() re-simulates from the
+    start
+
+    """
+
+    backend_types = {
+        "BackendEngine": BackendEngine,
+        "BackendPlacement": BackendPlacement,
+    }
+
+    def __init__(self, filename: str):
+        with np.load(filename) as data:
+            self._size = tuple(int(n) for n in data["size"])
+            seed = int(data["seed"])
+            self._tape = PieceTape(
+                data["pids"],
+                None if seed == -1 else seed,
+                *(
+                    (int(data["n_bags_block"]), int(data["n_blocks"]))
+                    if "n_bags_block" in data.files
+                    else ()
+                ),
+            )
+            self._actions = data["actions"]
+            if self._actions.ndim == 1:
+                # recordings before the raw pairs: flattened
+                self._actions = np.stack(np.divmod(self._actions, self._size[1]), 1)
+            self._keyframes = data["keyframes"]
+            self._keyframes_meta = data["keyframes_meta"]
+
+            if "backend" in data.files:
+                backend_name = str(data["backend"])
+            else:
+                # recordings before the backend was recorded: placement, the
+                # only backend that can start from their first keyframe
+                backend_name = "BackendPlacement"
+                print(
+                    "[REPLAY] legacy recording: re-simulated on the placement-"
+                    "backend, which is unverified against the engine"
+                )
+            self._cursor_start = (
+                int(data["cursor_start"]) if "cursor_start" in data.files else None
+            )
+
+        if backend_name not in EpisodeReplayer.backend_types:
+            raise ValueError("unknown backend of recording: {0}".format(backend_name))
+        self._env = ShetrisEnv(
+            displayer=[],
+            tape=self._tape,
+            backend=EpisodeReplayer.backend_types[backend_name](self._size),
+        )
+
+    @property
+    def env(self):
+        return self._env
+
+    @property
+    def n_steps(self):
+        return self._actions.shape[0]
+
+    @property
+    def can_jump(self) -> bool:
+        return hasattr(self._env.engine, "set_state")
+
+    def _get_keyframe_field(self, idx: int) -> np.ndarray:
+        return FieldCodec.unpack(self._keyframes[idx], self._size)
+
+    def _get_meta(self, idx: int) -> tuple[int, int, int, int, int, int]:
+        """
+        :param idx:
+        :return: step, tape-cursor, pid, n_pieces, n_lines, n_corrected (0 for
+        recordings before it was recorded)
+        """
+
+        meta = tuple(int(value) for value in self._keyframes_meta[idx])
+        return meta if len(meta) == 6 else meta + (0,)
+
+    def _run(self, step_from: int, step_to: int) -> None:
+        for action in self._actions[step_from:step_to]:
+            self._env.step(action.astype(np.int64))
+
+    def _start(self) -> int:
+        """
+        Reset to the episode's start: the engine draws the very same pids
+
+        :return: the step, i.e., 0
+        """
+
+        if self._cursor_start is None:
+            return self._restore(0)
+
+        self._tape.cursor = self._cursor_start
+        self._env.reset()
+        return 0
+
+    def _restore(self, idx: int) -> int:
+        """
+        Jump to a keyframe: field, piece, tape-position and counters
+
+        :param idx:
+        :return: the step of the keyframe
+        """
+
+        step_keyframe, cursor, pid, n_pieces, n_lines, n_corrected = self._get_meta(idx)
+
+        self._env.reset()
+        self._env.engine.set_state(self._get_keyframe_field(idx), pid)
+        self._tape.cursor = cursor
+        self._env.n_pieces, self._env.n_lines = n_pieces, n_lines
+        self._env.n_corrected = n_corrected
+
+        return step_keyframe
+
+    def replay(self) -> bool:
+        """
+        Replay the whole episode, from its start
+
+        :return: True if every keyframe (and the counters) match
+        """
+
+        step_curr, matched = self._start(), True
+        for idx in range(len(self._keyframes_meta)):
+            step, __, pid, n_pieces, n_lines, n_corrected = self._get_meta(idx)
+            self._run(step_curr, step)
+            step_curr = step
+
+            matched &= bool(
+                np.array_equal(
+                    self._env.engine.field.field, self._get_keyframe_field(idx)
+                )
+                and (self._env.n_pieces, self._env.n_lines) == (n_pieces, n_lines)
+                and (
+                    len(self._keyframes_meta[idx]) < 6
+                    or self._env.n_corrected == n_corrected
+                )
+            )
+
+        return matched
+
+    def seek(self, step: int) -> np.ndarray:
+        """
+        Find the field after some step:
+        1.  jump to the last keyframe not after the step (if possible)
+        2.  re-simulate from there
+
+        :param step:
+        :return:
+        """
+
+        step = min(max(step, 0), self.n_steps)
+        if self.can_jump:
+            idx = np.searchsorted(self._keyframes_meta[:, 0], step, side="right") - 1
+            step_from = self._restore(idx)
+        else:
+            step_from = self._start()
+
+        self._run(step_from, step)
+        return self._env.engine.field.field
+
+
+def record_replay_test(seed: int = 147, filename: str = "/tmp/shetris_episode.npz"):
+    from src.rl.shetris.env.recorder import EpisodeRecorder
+
+    recorder = EpisodeRecorder(keyframe_interval=50)
+    env = ShetrisEnv(displayer=[], recorder=recorder)
+    env.action_space.seed(seed)
+
+    env.reset(seed=seed)
+    done = False
+    while not done:
+        __, __, done, __ = env.step(env.action_space.sample())
+    recorder.save(filename, env)
+
+    replayer = EpisodeReplayer(filename)
+    print("[REPLAY] matched: {0}".format(replayer.replay()))
+    print("[SEEK] step 77:\n{0}".format(replayer.seek(77).astype(int)))
+
+
+if __name__ == "__main__":
+    pass
+    record_replay_test()
@@ -17,16 +17,19 @@
 #
 
 
-from typing import Dict, Tuple, Optional, Any, Type, Callable
+from typing import Dict, Tuple, Optional, Any, Type, Callable, TYPE_CHECKING
 
 import numpy as np
-import torch
 
 from src.engine.engine import Engine
 from src.engine.placement.field import Field
 from src.engine.placement.piece import CoordFactory
+from src.rl.shetris.env.masker import ActionMasker
 from src.rl.shetris.env.reporter.obs.obs import ObsStandard
 
+if TYPE_CHECKING:
+    import torch
+
 
 class _Helper:
     """
@@ -42,9 +45,7 @@ class _Helper:
     # else:
     #     pairs = self._get_action_obs_pairs(4)
 
-    _pid = list(range(7))
-    _n_rot = [1] + [2] * 3 + [4] * 3
-    pid_to_n_rot = dict(zip(_pid, _n_rot))
+    pid_to_n_rot = ActionMasker.pid_to_n_rot
 
     def __init__(self, engine: Engine, observer: ObsStandard):
         self._engine = engine
@@ -113,7 +114,7 @@ class _Helper:
 
         return obs
 
-    def get_action_obs_pairs(self) -> Dict[Tuple[int, int], torch.Tensor]:
+    def get_action_obs_pairs(self) -> Dict[Tuple[int, int], "torch.Tensor"]:
         """
         1.  get (action-obs) pairs
         2.  output has obs as Tensor!
@@ -162,16 +163,17 @@ class _Helper:
         return action_to_obs
 
     def single_action_obs(self, action: Tuple[int, int], action_obs_pairs):
+        import torch
+
         obs = self.get_obs_tmp(action)
 
         # actually failed PRE
         if obs is None:
-            obs = torch.zeros(4, dtype=torch.float)
-        else:
-            obs = torch.tensor(
-                torch.from_numpy(obs),
-                dtype=torch.float,
+            obs = torch.zeros(
+                len(self._observer.space_list), dtype=self._observer.dtype_torch
             )
+        else:
+            obs = torch.as_tensor(obs).to(self._observer.dtype_torch)
         action_obs_pairs[action] = obs
 
 
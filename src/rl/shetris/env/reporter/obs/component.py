@@ -28,6 +28,7 @@ from src.rl.shetris.analyzer.field import (
     ElevationAnalyzer,
     HoleAnalyzer,
 )
+from src.rl.shetris.env.tape import PieceTape
 
 
 class _ObsComponent:
@@ -186,7 +187,7 @@ class _ObsPid(_ObsEngineBased):
 
     def get_space(self) -> int:
         # return self.engine.generator.bag.size
-        return 7
+        return PieceTape.n_pids
 
     def get_obs(self) -> int:
         return self.engine.pid
@@ -17,12 +17,14 @@
 #
 
 
-from typing import Any, Optional
+from typing import Any, Optional, TYPE_CHECKING
 
 import gym
-import numpy
 import numpy as np
-import torch
+
+if TYPE_CHECKING:
+    # imported only once torch-obs are actually produced
+    import torch
 
 from src.engine.engine import Engine
 from src.engine.placement.field import Field
@@ -55,6 +57,14 @@ class ObsFac:
 
 
 class ObsStandard(ObsFac):
+    """
+    Every element of the obs is a small non-negative int, thus compact:
+    1.  numpy: the smallest unsigned dtype, e.g., uint8 for the standard field
+    2.  torch: uint8 or, as torch has no uint16, int16 (int32 if needed)
+    ->  converted to float only at the network's input
+
+    """
+
     def __init__(
         self,
         engine: Engine,
@@ -71,6 +81,8 @@ class ObsStandard(ObsFac):
             self._pid = _ObsPid(self._engine)
 
         self.space_list = self.set_space_list()
+        self.dtype = ObsStandard.get_dtype(self.space_list)
+        self._dtype_torch = None
 
         self._use_np = use_np
 
@@ -86,12 +98,49 @@ class ObsStandard(ObsFac):
 
         return space_list
 
+    @staticmethod
+    def get_dtype(space_list: list[int]) -> np.dtype:
+        """
+        The smallest dtype holding every element, i.e., [0, n) for every n of
+        the space_list
+
+        :param space_list:
+        :return:
+        """
+
+        return np.min_scalar_type(max(space_list) - 1)
+
+    @staticmethod
+    def get_dtype_torch(space_list: list[int]) -> "torch.dtype":
+        import torch
+
+        value_max = max(space_list) - 1
+        if value_max < 2**8:
+            return torch.uint8
+        if value_max < 2**15:
+            return torch.int16
+        return torch.int32
+
+    @property
+    def dtype_torch(self) -> "torch.dtype":
+        if self._dtype_torch is None:
+            self._dtype_torch = ObsStandard.get_dtype_torch(self.space_list)
+        return self._dtype_torch
+
     def get_space(self) -> gym.spaces.Space:
-        return gym.spaces.MultiDiscrete(self.space_list)
+        return gym.spaces.MultiDiscrete(self.space_list, dtype=self.dtype)
+
+    def _convert(self, obs_np: np.ndarray) -> "np.ndarray | torch.Tensor":
+        if self._use_np:
+            return obs_np.astype(self.dtype)
+        else:
+            import torch
+
+            return torch.from_numpy(obs_np).to(self.dtype_torch)
 
     def get_obs(
         self, line_chunks: list[np.ndarray], field_tmp: Optional[Field] = None, **kwargs
-    ) -> np.ndarray | torch.Tensor:
+    ) -> "np.ndarray | torch.Tensor":
         if field_tmp is None:
             field_observer = self._field_type(self._engine.field)
         else:
@@ -116,12 +165,9 @@ class ObsStandard(ObsFac):
                 )
             )
 
-        if self._use_np:
-            return obs_np
-        else:
-            return torch.from_numpy(numpy.array(obs_np, dtype=np.float32))
+        return self._convert(obs_np)
 
-    def get_obs_game_over(self) -> np.ndarray | torch.Tensor:
+    def get_obs_game_over(self) -> "np.ndarray | torch.Tensor":
         field_observer = self._field_type(self._engine.field)
         field = field_observer.get_obs_game_over()
 
@@ -143,10 +189,7 @@ class ObsStandard(ObsFac):
                 )
             )
 
-        if self._use_np:
-            return obs_np
-        else:
-            return torch.from_numpy(numpy.array(obs_np, dtype=np.float32))
+        return self._convert(obs_np)
 
 
 if __name__ == "__main__":
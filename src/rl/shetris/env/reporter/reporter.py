@@ -33,16 +33,19 @@ class Reporter:
     2.  reward
     3.  info
 
+    NOTE:
+    1.  with use_np, the obs are numpy-arrays and torch is never imported
+
     """
 
-    def __init__(self, engine: Engine):
+    def __init__(self, engine: Engine, use_np: bool = False):
         self._engine = engine
         self.obs_factory = ObsStandard(
             self.engine,
             use_compact_field=True,
             use_pid=False,
             # set to False only for manual DQN-training
-            use_np=False,
+            use_np=use_np,
         )
         self.rew_factory = RewardStandard(self.engine)
 
@@ -17,19 +17,21 @@
 #
 
 
-from typing import Tuple, Any, Optional, List
+from typing import Tuple, Any, Optional, List, Callable
 
 import gym
 import numpy as np
 
-from src.engine.engine import Engine
-from src.entry.fetcher.gym import FetcherGym
-from src.entry.stepper.freeze import FreezePhaseGym
-from src.entry.stepper.move import MovePhase
-from src.entry.stepper.pre import PrePhaseGym
+from src.rl.shetris.env.backend.base import Backend
+from src.rl.shetris.env.backend.engine import BackendEngine
 from src.rl.shetris.env.displayer.base import Displayer
+from src.rl.shetris.env.displayer.rgb import RendererRgb
 from src.rl.shetris.env.displayer.text import DisplayerText
+from src.rl.shetris.env.masker import ActionMasker
+from src.rl.shetris.env.profiler import StepProfiler
+from src.rl.shetris.env.recorder import EpisodeRecorder
 from src.rl.shetris.env.reporter.reporter import Reporter
+from src.rl.shetris.env.tape import PieceTape, GeneratorTape
 
 
 class ShetrisEnv(gym.Env):
@@ -47,42 +49,117 @@ class ShetrisEnv(gym.Env):
     3.  FREEZE-phase:
         1.  include the drop
 
+    NOTE:
+    1.  the phases are played by the backend:
+        1.  by default, the engine itself
+        2.  a provided backend takes precedence over the size
+    2.  use_np: numpy-obs, i.e., importing and running the env needs no torch
+    3.  on reset(), the tape (if any) plays on, i.e., every episode gets new
+    pieces; only rewind_on_reset replays the tape from its start every episode
+    (common random numbers)
+
     """
 
+    metadata = {
+        "render.modes": ["human", "rgb_array"],
+        "render_modes": ["human", "rgb_array"],
+    }
+
     def __init__(
         self,
         size: tuple[int, int] = (20, 10),
         displayer: Optional[List[Displayer]] = None,
+        tape: Optional[PieceTape] = None,
+        flatten_action: bool = False,
+        profile: bool = False,
+        backend: Optional[Backend] = None,
+        recorder: Optional[EpisodeRecorder] = None,
+        use_np: bool = False,
+        rewind_on_reset: bool = False,
     ):
         super().__init__()
 
-        self._engine = Engine(size)
-        self._fetcher = FetcherGym
-        self._provider = Reporter(self.engine)
+        self._backend = BackendEngine(size) if backend is None else backend
+        self._engine = self._backend.engine
+        self._tape = None
+        self._rewind_on_reset = rewind_on_reset
+        if tape is not None:
+            self._install_tape(tape)
+        self._provider = Reporter(self.engine, use_np=use_np)
         if displayer is None:
             self._displayers = [DisplayerText(self.engine)]
         else:
             self._displayers = displayer
 
+        self._masker = ActionMasker(self.engine)
+
         self.observation_space, self.action_space = None, None
         # set to True only if using DQN
-        self._flatten_action = False
+        self._flatten_action = flatten_action
         self._set_spaces()
 
         self.n_pieces, self.n_lines = 0, 0
+        self.n_corrected = 0
+
+        self._profiler = StepProfiler() if profile else None
+        self._recorder = recorder
+        self._renderer: Optional[RendererRgb] = None
 
     @property
     def engine(self):
         return self._engine
 
     @property
-    def fetcher(self):
-        return self._fetcher
+    def backend(self):
+        return self._backend
 
     @property
     def provider(self):
         return self._provider
 
+    @property
+    def tape(self):
+        return self._tape
+
+    @property
+    def masker(self):
+        return self._masker
+
+    @property
+    def profiler(self) -> Optional[StepProfiler]:
+        return self._profiler
+
+    @property
+    def recorder(self) -> Optional[EpisodeRecorder]:
+        return self._recorder
+
+    def _timed(self, phase: str, func: Callable, *args) -> Any:
+        """
+        Run one phase of the step, timed only if profiling
+
+        :param phase:
+        :param func:
+        :param args:
+        :return:
+        """
+
+        if self._profiler is None:
+            return func(*args)
+        return self._profiler.timed(phase, func, *args)
+
+    def action_masks(self) -> np.ndarray:
+        """
+        Legal-action mask of the current piece, as expected by maskable
+        policies
+
+        NOTE:
+        1.  always laid out as the flattened action-space
+
+        :return:
+        """
+
+        return self._masker.get_mask()
+
     def _set_spaces(self):
         """
         Set the spaces of the shetris
@@ -94,9 +171,11 @@ class ShetrisEnv(gym.Env):
         print(self.observation_space)
 
         if self._flatten_action:
-            self.action_space = gym.spaces.Discrete(40)
+            self.action_space = gym.spaces.Discrete(self._masker.n_actions)
         else:
-            self.action_space = gym.spaces.MultiDiscrete((4, 10))
+            self.action_space = gym.spaces.MultiDiscrete(
+                (ActionMasker.n_rot_max, self.engine.field.size[1])
+            )
 
     def _misc_init(self):
         """
@@ -112,82 +191,75 @@ class ShetrisEnv(gym.Env):
 
         self._set_seed()
 
-    def _set_seed(self, seed=None):
+    def _set_seed(self, seed: Optional[int] = None) -> Optional[List[int]]:
         """
-        Use gym's internal seeding mechanism to perform seeding, conforms to
-        the recommendation of gym's documentation:
+        Seed the env by switching to a piece-tape generated from the seed:
             https://www.gymlibrary.ml/content/api/#resetting
             https://www.gymlibrary.ml/content/environment_creation/#reset
 
-        from gym.utils.seeding import np_random
-
-        self.np_random, seed = np_random(seed)
-        return [seed]
-
         NOTE:
-        since
-        1.  gym's np_random uses the legacy RNG
-        2.  our engine's only random-source, the bag-generator, applies its own
-        RNG, nothing is performed here
+        1.  gym's np_random uses the legacy RNG and is thus NOT used
+        2.  our engine's only random-source is the bag-generator
+        ->  replace it with a tape, which is (by construction) seeded
+        3.  if no seed is provided, keep the current source of pids
 
         :param seed:
         :return:
         """
 
-        return
+        if seed is None:
+            return None
 
-    def reset(self):
-        """
-        Produce the gym-obs just after a reset
-
-        :return: observation (after a reset)
-        """
+        self._install_tape(PieceTape.from_seed(seed))
+        return [seed]
 
-        # print("RESET")
-        self.engine.reset()
-        self.n_pieces, self.n_lines = 0, 0
-        return self.provider.reset()
+    def seed(self, seed: Optional[int] = None) -> Optional[List[int]]:
+        return self._set_seed(seed)
 
-    def _pre_phase(self, action: np.ndarray) -> bool:
+    def _install_tape(self, tape: PieceTape) -> None:
         """
-        Apply pre_phase:
-        1.  use correction
-        2.  return the correction-result:
-            1.  True if correction was applied
-            2.  False otherwise
+        Let the engine draw its pids from the tape:
+        1.  swap out the engine's own bag-generator
+        2.  reset() plays on along the tape, unless rewind_on_reset
 
+        :param tape:
         :return:
         """
 
-        def action_generator():
-            return self.fetcher.get_pre_corrected(self.engine, action)
-
-        return PrePhaseGym.correction_aware(self.engine, action_generator)
+        self._tape = tape
+        self.engine.generator = GeneratorTape(self._tape)
 
-    @staticmethod
-    def _move_phase():
-        """
-        1.  Use the minimal Move-Phase
-
-        :return:
+    def reset(self, seed: Optional[int] = None):
         """
+        Produce the gym-obs just after a reset
 
-        MovePhase.minimal()
-
-    def _freeze_phase(self) -> list[np.ndarray]:
+        :param seed: if provided, (re-)seed the env's piece-tape, i.e., start
+        from the first pid of a fresh tape
+        :return: observation (after a reset)
         """
-        1.  Include a drop
 
-        :return:
-        """
+        # print("RESET")
+        self._set_seed(seed)
+        if self._tape is not None and self._rewind_on_reset:
+            self._tape.rewind()
+        cursor_start = None if self._tape is None else self._tape.cursor
 
-        return FreezePhaseGym.with_drop(self.engine)
+        self.engine.reset()
+        self.n_pieces, self.n_lines = 0, 0
+        self.n_corrected = 0
+        if self._recorder is not None:
+            self._recorder.start(self, cursor_start)
+        return self.provider.reset()
 
     def step(self, action: int | np.ndarray) -> Tuple[Any, float, bool, dict]:
         if self._flatten_action:
-            return self._step_flattened(action)
+            result = self._step_flattened(action)
         else:
-            return self._step(action)
+            result = self._step(action)
+
+        if self._recorder is not None:
+            self._recorder.record(action, self)
+        return result
 
     def _step_flattened(self, action: int) -> Tuple[Any, float, bool, dict]:
         """
@@ -227,7 +299,11 @@ class ShetrisEnv(gym.Env):
         """
 
         # print("STEP")
-        corrected = self._pre_phase(action)
+        corrected = self._timed("pre", self._backend.pre_phase, action)
+        self.n_corrected += corrected
+        if self._profiler is not None:
+            self._profiler.count_step(corrected)
+
         if self.engine.is_game_over:
             return self.step_game_over()
         else:
@@ -236,29 +312,49 @@ class ShetrisEnv(gym.Env):
     def step_game_over(self) -> Tuple[Any, float, bool, dict]:
         done = True
         obs, reward, info = self.provider.step_game_over()
+        info["n_corrected"] = self.n_corrected
+        if self._profiler is not None:
+            info["profile"] = self._profiler.get_summary()
 
         return obs, reward, done, info
 
     def step_game_on(self, corrected: bool) -> Tuple[Any, float, bool, dict]:
-        ShetrisEnv._move_phase()
-        line_chunks = self._freeze_phase()
+        self._timed("move", self._backend.move_phase)
+        line_chunks = self._timed("freeze", self._backend.freeze_phase)
         self.n_pieces += 1
         self.n_lines += sum([chunk.size for chunk in line_chunks])
 
         done = False
-        obs, reward, info = self.provider.step_game_on(corrected, line_chunks)
+        obs, reward, info = self._timed(
+            "report", self.provider.step_game_on, corrected, line_chunks
+        )
 
         return obs, reward, done, info
 
-    def render(self, mode: str = "human"):
+    def render(self, mode: str = "human") -> Optional[np.ndarray]:
         """
         1.  Do NOT put this in step()
         2.  let the enjoyer decide if they would like to render
+        3.  modes:
+            1.  human: call the displayers
+            2.  rgb_array: return the field as RGB-frame
+            ->  the frame is a reused buffer, copy it to keep it
 
         :param mode:
         :return:
         """
 
+        if mode == "rgb_array":
+            return self._timed("render", self._render_rgb)
+
+        self._timed("render", self._display)
+
+    def _render_rgb(self) -> np.ndarray:
+        if self._renderer is None:
+            self._renderer = RendererRgb(self.engine.field.size)
+        return self._renderer.render(self.engine.field.field)
+
+    def _display(self) -> None:
         for displayer in self._displayers:
             displayer.display(n_pieces=self.n_pieces, n_lines=self.n_lines)
 
@@ -0,0 +1,267 @@
+# The Reinforcement-Learning Module of the Shetris-Project
+#
+# Copyright (C) 2022 Shengdi 'shc' Chen (me@shengdichen.xyz)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from typing import Optional
+
+import numpy as np
+
+
+class PieceTape:
+    """
+    A pre-generated sequence of pids, i.e., the "tape" of pieces to be played:
+    1.  7-bag: every consecutive block of 7 pids is a permutation of all pids
+    2.  seedable: the same seed always produces the same tape
+    3.  compact: stored as a uint8-array
+
+    Usage:
+    1.  reproducible runs: replay the exact same piece-sequence
+    2.  common random numbers: evaluate competing agents (or heuristic-weights)
+    on the same tapes, such that the difference in score is not drowned in the
+    noise of different piece-sequences
+
+    NOTE:
+    1.  the tape is generated block-wise, every block of n_bags bags seeded by
+    (seed, block-number)
+    ->  a tape is extended deterministically if played past its end
+    2.  without seed (e.g., a hand-made tape), the whole original tape is
+    looped instead, whatever its length
+
+    """
+
+    n_pids = 7
+
+    def __init__(
+        self,
+        pids: np.ndarray,
+        seed: Optional[int] = None,
+        n_bags_block: Optional[int] = None,
+        n_blocks: int = 1,
+    ):
+        """
+        :param pids:
+        :param seed:
+        :param n_bags_block: bags per block; default: all pids form one block
+        :param n_blocks: generated (or looped) so far, i.e., of the pids
+        """
+
+        self._pids = np.asarray(pids, dtype=np.uint8)
+        if self._pids.size == 0:
+            raise ValueError("[TAPE] a tape needs at least one pid")
+        self._seed = seed
+        self._n_bags_block = (
+            max(self._pids.size // PieceTape.n_pids, 1)
+            if n_bags_block is None
+            else n_bags_block
+        )
+        self._n_blocks = n_blocks
+        # every block of an unseeded tape is one copy of the original tape
+        self._size_original = self._pids.size // n_blocks
+
+        self._cursor = 0
+
+    @property
+    def seed(self):
+        return self._seed
+
+    @property
+    def pids(self):
+        return self._pids
+
+    @property
+    def n_bags_block(self):
+        return self._n_bags_block
+
+    @property
+    def n_blocks(self):
+        return self._n_blocks
+
+    @property
+    def cursor(self):
+        return self._cursor
+
+    @cursor.setter
+    def cursor(self, value: int):
+        self._cursor = value
+
+    @staticmethod
+    def _get_block(seed: int, block_n: int, n_bags: int) -> np.ndarray:
+        """
+        Generate one block of bags:
+        1.  every row is one bag, i.e., [0, 7) in order
+        2.  shuffle each row independently
+
+        :param seed:
+        :param block_n:
+        :param n_bags:
+        :return:
+        """
+
+        rng = np.random.default_rng((seed, block_n))
+        bags = np.tile(np.arange(PieceTape.n_pids, dtype=np.uint8), (n_bags, 1))
+
+        return rng.permuted(bags, axis=1).ravel()
+
+    @classmethod
+    def from_seed(cls, seed: int, n_bags: int = 1024) -> "PieceTape":
+        """
+        Generate a tape of (initially) n_bags bags
+
+        :param seed:
+        :param n_bags:
+        :return:
+        """
+
+        return cls(PieceTape._get_block(seed, 0, n_bags), seed)
+
+    @classmethod
+    def from_seeds(
+        cls, seed: int, n_tapes: int, n_bags: int = 1024
+    ) -> list["PieceTape"]:
+        """
+        Generate many independent tapes from one master-seed, e.g., one tape per
+        evaluation-game
+
+        :param seed:
+        :param n_tapes:
+        :param n_bags:
+        :return:
+        """
+
+        seeds = np.random.SeedSequence(seed).generate_state(n_tapes)
+        return [cls.from_seed(int(s), n_bags) for s in seeds]
+
+    def _extend(self) -> None:
+        """
+        Append the next block of bags; without seed, the original tape again
+
+        :return:
+        """
+
+        if self._seed is None:
+            block = self._pids[: self._size_original]
+        else:
+            block = PieceTape._get_block(self._seed, self._n_blocks, self._n_bags_block)
+        self._pids = np.concatenate((self._pids, block))
+        self._n_blocks += 1
+
+    def get_pid(self) -> int:
+        """
+        Draw the next pid and advance the tape
+
+        :return:
+        """
+
+        if self._cursor >= self._pids.size:
+            self._extend()
+
+        pid = int(self._pids[self._cursor])
+        self._cursor += 1
+
+        return pid
+
+    def peek(self, n: int) -> np.ndarray:
+        """
+        View the next n pids without advancing, e.g., for the preview
+
+        :param n:
+        :return:
+        """
+
+        while self._cursor + n > self._pids.size:
+            self._extend()
+
+        return self._pids[self._cursor : self._cursor + n]
+
+    def rewind(self) -> None:
+        """
+        Start over from the first pid
+
+        :return:
+        """
+
+        self._cursor = 0
+
+    def save(self, filename: str) -> None:
+        """
+        The pids and seed, and the block-layout: a loaded tape extends exactly
+        as the original
+
+        :param filename:
+        :return:
+        """
+
+        np.savez(
+            filename,
+            pids=self._pids,
+            seed=np.array(-1 if self._seed is None else self._seed, dtype=np.int64),
+            n_bags_block=np.array(self._n_bags_block, dtype=np.int64),
+            n_blocks=np.array(self._n_blocks, dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, filename: str) -> "PieceTape":
+        with np.load(filename) as data:
+            seed = int(data["seed"])
+            if "n_bags_block" not in data.files:
+                return cls(data["pids"], None if seed == -1 else seed)
+            return cls(
+                data["pids"],
+                None if seed == -1 else seed,
+                int(data["n_bags_block"]),
+                int(data["n_blocks"]),
+            )
+
+
+class GeneratorTape:
+    """
+    Stand-in for the engine's bag-generator:
+    1.  the engine draws its next pid from the tape (instead of its own RNG)
+
+    """
+
+    def __init__(self, tape: PieceTape):
+        self._tape = tape
+
+    @property
+    def tape(self):
+        return self._tape
+
+    def reset(self) -> None:
+        # whether to rewind is up to the env, see ShetrisEnv.reset()
+        pass
+
+    def get_pid(self) -> int:
+        return self._tape.get_pid()
+
+
+def tape_test():
+    tape = PieceTape.from_seed(147, n_bags=2)
+    print(tape.pids)
+    print([tape.get_pid() for __ in range(21)])
+    print(tape.pids)
+
+    tape.rewind()
+    print(tape.peek(7))
+
+    print([t.pids[:7] for t in PieceTape.from_seeds(147, 3)])
+
+
+if __name__ == "__main__":
+    pass
+    tape_test()
@@ -0,0 +1,125 @@
+import time
+from typing import Any, Optional, Tuple, Union
+
+import torch
+
+from src.rl.shetris.env.reporter.combi import ActionToObs
+from src.rl.shetris.env.shenv import ShetrisEnv
+from src.rl.util.dqn.inference import Inference
+from src.rl.util.dqn.util import Chooser
+
+
+class AgentBatched:
+    """
+    Act for many envs with one forward-pass:
+    1.  collect the candidate (action, obs)-pairs of every env
+    2.  concatenate all obs into one matrix, remembering each env's segment
+    3.  one forward-pass over the whole matrix
+    4.  segmented argmax: the best candidate within every env's segment
+
+    NOTE:
+    1.  decides like Agent.act_best(), i.e., ties go to the first candidate
+    2.  an env without any candidate gets no decision (None), it is up to the
+    caller to skip (or reset) it
+
+    """
+
+    def __init__(
+        self, model: Union[torch.nn.Module, Inference], envs: list[ShetrisEnv]
+    ):
+        self._model = model
+        self._envs = envs
+        self._action_to_obs = [
+            ActionToObs(env.engine, env.provider.obs_factory) for env in self._envs
+        ]
+
+    @property
+    def envs(self):
+        return self._envs
+
+    def _get_action_obs(self) -> Tuple[list, torch.Tensor, torch.Tensor]:
+        """
+        1.  find all (action, obs)-pairs of every env
+        2.  concatenate:
+            1.  the actions: as a flat list
+            2.  the obs: as one matrix, each row is an obs
+            3.  the number of candidates of every env
+
+        :return:
+        """
+
+        action_all, obs_all, lengths = [], [], []
+        for action_to_obs in self._action_to_obs:
+            actions, obs = action_to_obs.get_action_obs_unpacked()
+            action_all.extend(actions)
+            obs_all.extend(obs)
+            lengths.append(len(actions))
+
+        return action_all, torch.stack(obs_all), torch.tensor(lengths)
+
+    def act_best(self) -> list[Optional[Tuple[Any, Any]]]:
+        """
+        Act in the best-sense of q-val, for every env
+
+        :return: the chosen (action, obs) of every env; None if it has no
+        candidate
+        """
+
+        action_all, obs_all, lengths = self._get_action_obs()
+        q_val_all = self._model(obs_all)[:, 0]
+
+        idx_best = Chooser.get_idx_best_segmented(q_val_all, lengths).tolist()
+        return [
+            (
+                Chooser.get_action_obs_chosen(action_all, obs_all, idx)
+                if length > 0
+                else None
+            )
+            for idx, length in zip(idx_best, lengths.tolist())
+        ]
+
+
+def batched_test(n_envs_all: tuple[int, ...] = (1, 4, 16, 64), n_steps: int = 50):
+    """
+    Per-env decision-cost with a growing number of envs
+
+    :param n_envs_all:
+    :param n_steps:
+    :return:
+    """
+
+    from src.rl.util.dqn.network import DeepQNetwork
+
+    for n_envs in n_envs_all:
+        envs = [ShetrisEnv(displayer=[]) for __ in range(n_envs)]
+        model = DeepQNetwork(len(envs[0].provider.obs_factory.space_list))
+        model.eval()
+        agent = AgentBatched(model, envs)
+        for env in envs:
+            env.reset()
+
+        time_total = 0.0
+        for __ in range(n_steps):
+            time_start = time.perf_counter()
+            with torch.no_grad():
+                decisions = agent.act_best()
+            time_total += time.perf_counter() - time_start
+
+            for env, decision in zip(envs, decisions):
+                if decision is None:
+                    env.reset()
+                    continue
+                __, __, done, __ = env.step(decision[0])
+                if done:
+                    env.reset()
+
+        print(
+            "[ENVS] {0:>3}: {1:.1f}us per env-decision".format(
+                n_envs, time_total / n_steps / n_envs * 1e6
+            )
+        )
+
+
+if __name__ == "__main__":
+    pass
+    batched_test()
@@ -0,0 +1,333 @@
+import copy
+import json
+import os
+import queue
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import torch
+
+
+class Checkpoint:
+    """
+    One checkpoint <name> in a directory consists of:
+    1.  <name>.json: the manifest
+        1.  layout of the weights: (key, shape, offset) of every tensor
+        2.  filename of the weights, of the optimizer- and replay-state (if any)
+        3.  the meta-data, e.g., step-counters
+    2.  <name>.<token>.npy: all weights, flattened into one float32-vector
+    3.  <name>.<token>.opt: the optimizer's state_dict, if any
+    4.  <name>.<token>.replay.npz: the replay-memory's state, if any
+    ->  uncompressed: every field is read back in bulk
+
+    NOTE:
+    1.  atomic: the data-files are fresh (new token) on every save, the
+    manifest is replaced last, and only then are the previous data-files removed
+    ->  a reader sees either the old or the new checkpoint, never a mixture
+    2.  the weights can be memory-mapped: loading needs no unpickling at all
+
+    """
+
+    @staticmethod
+    def get_path_manifest(directory: str, name: str) -> Path:
+        return Path(directory) / "{0}.json".format(name)
+
+    @staticmethod
+    def exists(directory: str, name: str) -> bool:
+        return Checkpoint.get_path_manifest(directory, name).is_file()
+
+    @staticmethod
+    def get_snapshot(
+        model: torch.nn.Module,
+        optimizer: Optional[torch.optim.Optimizer] = None,
+        meta: Optional[dict[str, Any]] = None,
+        replay: Optional[dict[str, np.ndarray]] = None,
+    ) -> dict[str, Any]:
+        """
+        Copy everything to be saved, so that training can go on immediately
+
+        :param model:
+        :param optimizer:
+        :param meta:
+        :param replay: the replay-memory's state, already a copy
+        :return:
+        """
+
+        return {
+            "model": {
+                key: tensor.detach().cpu().clone()
+                for key, tensor in model.state_dict().items()
+            },
+            "optimizer": (
+                None if optimizer is None else copy.deepcopy(optimizer.state_dict())
+            ),
+            "meta": {} if meta is None else dict(meta),
+            "replay": replay,
+        }
+
+    @staticmethod
+    def _replace(path_tmp: Path, path: Path) -> None:
+        with open(path_tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(path_tmp, path)
+
+    @staticmethod
+    def write(directory: str, name: str, snapshot: dict[str, Any]) -> None:
+        """
+        1.  write the data-files under a fresh token
+        2.  replace the manifest
+        3.  remove the data-files of the replaced manifest
+
+        :param directory:
+        :param name:
+        :param snapshot:
+        :return:
+        """
+
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        token = uuid.uuid4().hex[:12]
+
+        layout, offset = [], 0
+        for key, tensor in snapshot["model"].items():
+            layout.append((key, list(tensor.shape), offset))
+            offset += tensor.numel()
+        weights = np.empty(offset, dtype=np.float32)
+        for (__, __, offset), tensor in zip(layout, snapshot["model"].values()):
+            weights[offset : offset + tensor.numel()] = tensor.reshape(-1).numpy()
+
+        filename_weights = "{0}.{1}.npy".format(name, token)
+        with open(directory / (filename_weights + ".tmp"), "wb") as f:
+            np.save(f, weights)
+        Checkpoint._replace(
+            directory / (filename_weights + ".tmp"), directory / filename_weights
+        )
+
+        filename_optimizer = None
+        if snapshot["optimizer"] is not None:
+            filename_optimizer = "{0}.{1}.opt".format(name, token)
+            torch.save(snapshot["optimizer"], directory / (filename_optimizer + ".tmp"))
+            Checkpoint._replace(
+                directory / (filename_optimizer + ".tmp"),
+                directory / filename_optimizer,
+            )
+
+        filename_replay = None
+        if snapshot["replay"] is not None:
+            filename_replay = "{0}.{1}.replay.npz".format(name, token)
+            with open(directory / (filename_replay + ".tmp"), "wb") as f:
+                np.savez(f, **snapshot["replay"])
+            Checkpoint._replace(
+                directory / (filename_replay + ".tmp"), directory / filename_replay
+            )
+
+        manifest_old = (
+            Checkpoint.load_manifest(str(directory), name)
+            if Checkpoint.exists(str(directory), name)
+            else None
+        )
+        path_manifest = Checkpoint.get_path_manifest(str(directory), name)
+        with open(str(path_manifest) + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "weights": filename_weights,
+                    "layout": layout,
+                    "optimizer": filename_optimizer,
+                    "replay": filename_replay,
+                    "meta": snapshot["meta"],
+                },
+                f,
+            )
+        Checkpoint._replace(Path(str(path_manifest) + ".tmp"), path_manifest)
+
+        if manifest_old is not None:
+            for filename in (
+                manifest_old["weights"],
+                manifest_old["optimizer"],
+                manifest_old.get("replay"),
+            ):
+                if filename is not None:
+                    (directory / filename).unlink(missing_ok=True)
+
+    @staticmethod
+    def load_manifest(directory: str, name: str) -> dict[str, Any]:
+        with open(Checkpoint.get_path_manifest(directory, name)) as f:
+            return json.load(f)
+
+    @staticmethod
+    def load_weights(
+        directory: str, name: str, mmap: bool = True
+    ) -> dict[str, np.ndarray]:
+        """
+        Every weight, as a view into the (memory-mapped) weights-file
+
+        NOTE:
+        1.  copy-on-write mapping: the views are writable, but the file is never
+        touched; pages are only read when used
+
+        :param directory:
+        :param name:
+        :param mmap:
+        :return:
+        """
+
+        manifest = Checkpoint.load_manifest(directory, name)
+        weights = np.load(
+            Path(directory) / manifest["weights"], mmap_mode="c" if mmap else None
+        )
+
+        return {
+            key: weights[offset : offset + int(np.prod(shape))].reshape(shape)
+            for key, shape, offset in manifest["layout"]
+        }
+
+    @staticmethod
+    def load_state_dict(
+        directory: str, name: str, mmap: bool = True
+    ) -> dict[str, torch.Tensor]:
+        return {
+            key: torch.from_numpy(weight)
+            for key, weight in Checkpoint.load_weights(directory, name, mmap).items()
+        }
+
+    @staticmethod
+    def load_optimizer(
+        directory: str, name: str, optimizer: torch.optim.Optimizer
+    ) -> bool:
+        """
+        :param directory:
+        :param name:
+        :param optimizer:
+        :return: if the checkpoint contains an optimizer-state at all
+        """
+
+        filename = Checkpoint.load_manifest(directory, name)["optimizer"]
+        if filename is None:
+            return False
+
+        optimizer.load_state_dict(torch.load(Path(directory) / filename))
+        return True
+
+    @staticmethod
+    def load_replay(directory: str, name: str) -> Optional[dict[str, np.ndarray]]:
+        """
+        :param directory:
+        :param name:
+        :return: the replay-memory's state, None if the checkpoint has none
+        """
+
+        filename = Checkpoint.load_manifest(directory, name).get("replay")
+        if filename is None:
+            return None
+
+        with np.load(Path(directory) / filename) as replay:
+            return {key: replay[key] for key in replay.files}
+
+
+class CheckpointWriter:
+    """
+    Save checkpoints on a background-thread:
+    1.  the training-thread only takes a snapshot (see Checkpoint.get_snapshot)
+    2.  the background-thread serializes and writes, in order of submission
+
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                try:
+                    Checkpoint.write(*job)
+                except BaseException as e:
+                    self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def submit(
+        self,
+        directory: str,
+        name: str,
+        model: torch.nn.Module,
+        optimizer: Optional[torch.optim.Optimizer] = None,
+        meta: Optional[dict[str, Any]] = None,
+        replay: Optional[dict[str, np.ndarray]] = None,
+    ) -> None:
+        """
+        :param directory:
+        :param name:
+        :param model:
+        :param optimizer:
+        :param meta:
+        :param replay: the replay-memory's state, already a copy
+        :return:
+        """
+
+        self._raise_error()
+        self._queue.put(
+            (directory, name, Checkpoint.get_snapshot(model, optimizer, meta, replay))
+        )
+
+    def flush(self) -> None:
+        """
+        Block until every submitted checkpoint is written
+
+        :return:
+        """
+
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+
+def checkpoint_test(directory: str = "/tmp/shetris_checkpoint"):
+    from src.rl.util.dqn.network import DeepQNetwork
+
+    model = DeepQNetwork()
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    model(torch.rand(8, 4)).sum().backward()
+    optimizer.step()
+
+    writer = CheckpointWriter()
+    for step_num in range(3):
+        writer.submit(directory, "latest", model, optimizer, {"step_num": step_num})
+    writer.close()
+
+    model_loaded = DeepQNetwork()
+    model_loaded.load_state_dict(Checkpoint.load_state_dict(directory, "latest"))
+    optimizer_loaded = torch.optim.Adam(model_loaded.parameters(), lr=1e-3)
+    Checkpoint.load_optimizer(directory, "latest", optimizer_loaded)
+
+    obs = torch.rand(30, 4)
+    print(
+        "[CHECKPOINT] meta {0}, same q-vals: {1}, files: {2}".format(
+            Checkpoint.load_manifest(directory, "latest")["meta"],
+            torch.equal(model(obs), model_loaded(obs)),
+            sorted(os.listdir(directory)),
+        )
+    )
+
+
+if __name__ == "__main__":
+    pass
+    checkpoint_test()
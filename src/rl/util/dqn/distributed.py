@@ -0,0 +1,226 @@
+import random
+import time
+from typing import Any
+
+import numpy as np
+import torch
+import torch.multiprocessing
+
+from src.rl.shetris.env.shenv import ShetrisEnv
+from src.rl.util.dqn.inference import InferenceNumpy
+from src.rl.util.dqn.model import ModelDqn
+from src.rl.util.dqn.network import DeepQNetwork
+from src.rl.util.dqn.replay import ReplayShared
+from src.rl.util.dqn.util import Agent
+
+
+def _run_actor(
+    actor_id: int,
+    epsilon: float,
+    replay: ReplayShared,
+    model_shared: DeepQNetwork,
+    weights_version: Any,
+    stats: Any,
+    stop: Any,
+) -> None:
+    """
+    One actor-process:
+    1.  play its own env with its own numpy-copy of the network, epsilon-greedily
+    2.  write every transition into the shared replay-memory
+    3.  pick up newly published weights whenever their version changes
+
+    :param actor_id:
+    :param epsilon: fixed for this actor
+    :param replay:
+    :param model_shared: the learner's latest published weights
+    :param weights_version:
+    :param stats: n_episodes, n_pieces and n_lines of the latest episode
+    :param stop:
+    :return:
+    """
+
+    torch.set_num_threads(1)
+    random.seed(actor_id)
+    torch.manual_seed(actor_id)
+
+    env = ShetrisEnv(displayer=[])
+    with weights_version.get_lock():
+        inference = InferenceNumpy(model_shared)
+        version_local = weights_version.value
+    agent = Agent(inference, env)
+
+    obs = env.reset()
+    while not stop.is_set():
+        if weights_version.value != version_local:
+            with weights_version.get_lock():
+                inference.update(model_shared)
+                version_local = weights_version.value
+
+        if random.random() <= epsilon:
+            action, obs_next = agent.act_random()
+        else:
+            action, obs_next = agent.act_best()
+        __, reward, done, __ = env.step(action)
+        replay.append(obs, reward, obs_next, done)
+
+        if done:
+            with stats.get_lock():
+                stats[0] += 1
+                stats[1], stats[2] = env.n_pieces, env.n_lines
+            obs = env.reset()
+        else:
+            obs = obs_next
+
+
+class ModelDqnDistributed(ModelDqn):
+    """
+    DQN with the actor/learner split (Ape-X style):
+        https://arxiv.org/abs/1803.00933
+    1.  n_actors processes, each stepping its own env with its own copy of the
+    network, and writing into the shared replay-memory
+    2.  this (the learner's) process trains continuously on the replay-memory
+    and publishes its weights every publish_interval updates
+
+    NOTE:
+    1.  as in ModelDqn, an "episode" of the learner is one gradient-step
+    2.  every actor has its own fixed epsilon: epsilon_base^(1 + alpha*i/(n-1))
+    3.  prioritized replay is not supported: the sum-tree is not shared
+
+    """
+
+    def __init__(
+        self,
+        env: ShetrisEnv,
+        n_actors: int = 4,
+        publish_interval: int = 50,
+        epsilon_base: float = 0.4,
+        epsilon_alpha: float = 7.0,
+        do_resume: bool = False,
+    ):
+        super().__init__(env, do_resume=do_resume)
+
+        self.n_actors = n_actors
+        self.publish_interval = publish_interval
+        self.epsilon_base, self.epsilon_alpha = epsilon_base, epsilon_alpha
+
+        self._ctx = torch.multiprocessing.get_context("spawn")
+        replay_resumed = self.replay_memory
+        self.replay_memory = ReplayShared(
+            self.replay_memory_size, self.n_obs, self._ctx, self.obs_dtype
+        )
+        state = replay_resumed.get_state()
+        # the resumed step_num, not the replay's size: the steps count on
+        state["n_appended"] = np.array(self.step_num)
+        self.replay_memory.set_state(state)
+
+        self.model_shared = DeepQNetwork(self.n_obs)
+        self.model_shared.load_state_dict(self.model.state_dict())
+        self.model_shared.share_memory()
+        self.weights_version = self._ctx.Value("q", 0)
+        self.stats = self._ctx.Array("q", 3)
+        self.stop = self._ctx.Event()
+
+    def get_epsilon_actor(self, actor_id: int) -> float:
+        exponent = 1 + self.epsilon_alpha * actor_id / max(self.n_actors - 1, 1)
+        return self.epsilon_base**exponent
+
+    def publish_weights(self) -> None:
+        with self.weights_version.get_lock():
+            self.model_shared.load_state_dict(self.model.state_dict())
+            self.weights_version.value += 1
+
+    def _start_actors(self) -> list:
+        actors = [
+            self._ctx.Process(
+                target=_run_actor,
+                args=(
+                    actor_id,
+                    self.get_epsilon_actor(actor_id),
+                    self.replay_memory,
+                    self.model_shared,
+                    self.weights_version,
+                    self.stats,
+                    self.stop,
+                ),
+                daemon=True,
+            )
+            for actor_id in range(self.n_actors)
+        ]
+        for actor in actors:
+            actor.start()
+
+        return actors
+
+    @staticmethod
+    def _check_actors(actors: list) -> None:
+        """
+        The actors only stop once told to: any exited one has failed, e.g., on
+        an import-error in the spawned process
+
+        :param actors:
+        :return:
+        """
+
+        for actor_id, actor in enumerate(actors):
+            if not actor.is_alive():
+                raise RuntimeError(
+                    "[ACTOR] actor {0} died with exit-code {1}".format(
+                        actor_id, actor.exitcode
+                    )
+                )
+
+    def _stop_actors(self, actors: list) -> None:
+        self.stop.set()
+        for actor in actors:
+            actor.join()
+
+    def train(self):
+        actors = self._start_actors()
+
+        try:
+            while len(self.replay_memory) < self.replay_memory_size_pre_fill:
+                ModelDqnDistributed._check_actors(actors)
+                time.sleep(0.1)
+            print("[REPLAY] pre-built: length now {0}".format(len(self.replay_memory)))
+
+            while self.episode_num < self.n_episodes:
+                ModelDqnDistributed._check_actors(actors)
+                self.episode_num += 1
+                self.learn()
+
+                self.step_num = self.replay_memory.n_appended
+                self.n_pieces, self.n_lines = self.stats[1], self.stats[2]
+                if self.episode_num % self.publish_interval == 0:
+                    self.publish_weights()
+                    print(
+                        "Update-Nr.{0} of {1} | actor-episodes {2} | "
+                        "n_pieces {3} @ n_lines {4}".format(
+                            self.episode_num,
+                            self.n_episodes,
+                            self.stats[0],
+                            self.n_pieces,
+                            self.n_lines,
+                        )
+                    )
+
+                self.write_log()
+                self.save_progress()
+        except BaseException:
+            self._stop_actors(actors)
+            self.close()
+            raise
+        self._stop_actors(actors)
+
+        self.save_final()
+        self.close()
+
+
+def run_train_distributed(do_resume: bool = False):
+    env = ShetrisEnv()
+    model = ModelDqnDistributed(env, do_resume=do_resume)
+
+    model.train()
+
+
+if __name__ == "__main__":
+    run_train_distributed()
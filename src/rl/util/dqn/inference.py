@@ -0,0 +1,279 @@
+import copy
+import time
+from typing import Union
+
+import numpy as np
+import torch
+from torch import nn
+
+
+class Inference:
+    """
+    Forward-pass only, for acting (never for learning):
+    1.  input: the obs-matrix, each row is an obs
+    2.  output: the q-val matrix, each row is a q-val
+
+    NOTE:
+    1.  callable like the torch.nn.Module itself, thus usable wherever the
+    model is only evaluated, e.g., Agent
+
+    """
+
+    def update(self, model: nn.Module) -> None:
+        """
+        Pick up the (new) weights of the model
+
+        :param model:
+        :return:
+        """
+
+        pass
+
+    def __call__(self, obs_all: torch.Tensor) -> torch.Tensor:
+        pass
+
+
+class InferenceNumpy(Inference):
+    """
+    Export the weights to numpy, forward-pass without any torch-dispatch:
+    1.  every nn.Linear of the model, in order, as (weight^T, bias)
+    2.  ReLU between every two consecutive layers, as in DeepQNetwork
+
+    NOTE:
+    1.  for small batches (~30 rows per decision), torch's dispatch costs more
+    than the arithmetic itself
+
+    """
+
+    def __init__(self, model: nn.Module):
+        self._layers: list[tuple[np.ndarray, np.ndarray]] = []
+        self.update(model)
+
+    def update(self, model: nn.Module) -> None:
+        with torch.no_grad():
+            self._layers = [
+                (
+                    np.ascontiguousarray(m.weight.numpy().T, dtype=np.float32),
+                    m.bias.numpy().astype(np.float32),
+                )
+                for m in model.modules()
+                if isinstance(m, nn.Linear)
+            ]
+
+    def forward(self, x: np.ndarray) -> np.ndarray:
+        for weight, bias in self._layers[:-1]:
+            x = x @ weight
+            x += bias
+            np.maximum(x, 0, out=x)
+
+        weight, bias = self._layers[-1]
+        return x @ weight + bias
+
+    def __call__(self, obs_all: Union[torch.Tensor, np.ndarray]) -> torch.Tensor:
+        if isinstance(obs_all, torch.Tensor):
+            obs_all = obs_all.numpy()
+
+        return torch.from_numpy(self.forward(obs_all.astype(np.float32, copy=False)))
+
+
+class InferenceTorch(Inference):
+    """
+    Stay in torch, but strip the autograd-machinery:
+    1.  TorchScript the model, if possible
+    2.  forward-pass under torch.inference_mode()
+
+    """
+
+    def __init__(self, model: nn.Module, script: bool = True):
+        self._model = InferenceTorch._get_scripted(model) if script else model
+        self._model.eval()
+
+    @staticmethod
+    def _get_scripted(model: nn.Module) -> nn.Module:
+        """
+        1.  TorchScript a copy of the model, leaving the original untouched
+        2.  fall back to the (eager) model if scripting fails
+
+        :param model:
+        :return:
+        """
+
+        model_copy = copy.deepcopy(model)
+        try:
+            return torch.jit.script(model_copy)
+        except Exception:
+            return model_copy
+
+    def update(self, model: nn.Module) -> None:
+        self._model.load_state_dict(model.state_dict())
+
+    def __call__(self, obs_all: torch.Tensor) -> torch.Tensor:
+        with torch.inference_mode():
+            return self._model(obs_all)
+
+
+class InferenceBenchmark:
+    """
+    Time every backend on random obs-matrices of every batch-size:
+    1.  numpy: InferenceNumpy
+    2.  torch: InferenceTorch
+    3.  eager: the model itself under torch.no_grad(), as reference
+
+    All timings in microseconds per forward-pass.
+
+    """
+
+    batch_sizes = (1, 8, 32, 128, 512)
+
+    def __init__(
+        self,
+        model: nn.Module,
+        batch_sizes: tuple[int, ...] = batch_sizes,
+        n_calls: int = 200,
+    ):
+        self._model = model
+        self._batch_sizes = batch_sizes
+        self._n_calls = n_calls
+
+        self._backends = {
+            "numpy": InferenceNumpy(model),
+            "torch": InferenceTorch(model),
+        }
+
+    @property
+    def backends(self) -> dict[str, Inference]:
+        return self._backends
+
+    def _time(self, func, obs_all: torch.Tensor) -> float:
+        func(obs_all)
+
+        time_start = time.perf_counter()
+        for __ in range(self._n_calls):
+            func(obs_all)
+
+        return (time.perf_counter() - time_start) / self._n_calls * 1e6
+
+    def _time_eager(self, obs_all: torch.Tensor) -> float:
+        with torch.no_grad():
+            return self._time(self._model, obs_all)
+
+    def run(self) -> dict[int, dict[str, float]]:
+        n_obs = next(
+            m for m in self._model.modules() if isinstance(m, nn.Linear)
+        ).in_features
+
+        results = {}
+        for batch_size in self._batch_sizes:
+            obs_all = torch.rand(batch_size, n_obs)
+            results[batch_size] = {
+                name: self._time(backend, obs_all)
+                for name, backend in self._backends.items()
+            }
+            results[batch_size]["eager"] = self._time_eager(obs_all)
+
+        return results
+
+    def get_fastest(self) -> dict[int, str]:
+        """
+        The fastest backend for every batch-size, eager excluded
+
+        :return:
+        """
+
+        return {
+            batch_size: min(self._backends, key=lambda name: result[name])
+            for batch_size, result in self.run().items()
+        }
+
+    def print_summary(self) -> None:
+        for batch_size, result in self.run().items():
+            print(
+                "[BATCH] {0:>4}: {1}".format(
+                    batch_size,
+                    ", ".join(
+                        "{0} {1:.1f}us".format(name, time_us)
+                        for name, time_us in result.items()
+                    ),
+                )
+            )
+
+
+class InferenceAuto(Inference):
+    """
+    Pick, per batch-size, the backend that benchmarked fastest:
+    1.  benchmark every backend once, on construction
+    2.  on every call, use the winner of the smallest benchmarked batch-size
+    that is no smaller than the actual one (the largest, if none)
+
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        batch_sizes: tuple[int, ...] = InferenceBenchmark.batch_sizes,
+        n_calls: int = 200,
+    ):
+        benchmark = InferenceBenchmark(model, batch_sizes, n_calls)
+        self._backends = benchmark.backends
+        self._fastest = sorted(benchmark.get_fastest().items())
+
+    @property
+    def fastest(self) -> list[tuple[int, str]]:
+        return self._fastest
+
+    def _get_backend(self, batch_size: int) -> Inference:
+        for batch_size_benchmarked, name in self._fastest:
+            if batch_size <= batch_size_benchmarked:
+                return self._backends[name]
+
+        return self._backends[self._fastest[-1][1]]
+
+    def update(self, model: nn.Module) -> None:
+        for backend in self._backends.values():
+            backend.update(model)
+
+    def __call__(self, obs_all: torch.Tensor) -> torch.Tensor:
+        return self._get_backend(obs_all.shape[0])(obs_all)
+
+
+def get_inference(model: nn.Module, backend: str = "auto") -> Inference:
+    """
+    :param model:
+    :param backend: one of "numpy", "torch", "auto"
+    :return:
+    """
+
+    backend_types = {
+        "numpy": InferenceNumpy,
+        "torch": InferenceTorch,
+        "auto": InferenceAuto,
+    }
+    if backend not in backend_types:
+        raise ValueError("unknown inference-backend: {0}".format(backend))
+
+    return backend_types[backend](model)
+
+
+def inference_test():
+    from src.rl.util.dqn.network import DeepQNetwork
+
+    model = DeepQNetwork()
+    model.eval()
+
+    obs_all = torch.rand(30, 4)
+    with torch.no_grad():
+        q_val_reference = model(obs_all)
+    for backend in ("numpy", "torch", "auto"):
+        q_val = get_inference(model, backend)(obs_all)
+        print(
+            "[{0}] max-deviation: {1:.2e}".format(
+                backend, (q_val - q_val_reference).abs().max().item()
+            )
+        )
+
+    InferenceBenchmark(model).print_summary()
+
+
+if __name__ == "__main__":
+    pass
+    inference_test()
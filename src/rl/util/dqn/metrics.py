@@ -0,0 +1,232 @@
+import collections
+import csv
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+Record = tuple[str, float, int, float]
+
+
+class Sink:
+    """
+    Where the buffered scalars finally go:
+    1.  every record is (tag, value, step, walltime)
+    2.  only ever called from one thread at a time (see MetricsLogger)
+
+    """
+
+    def write(self, records: list[Record]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SinkTensorboard(Sink):
+    def __init__(self, log_dir: str):
+        from torch.utils.tensorboard import SummaryWriter
+
+        self._writer = SummaryWriter(log_dir)
+
+    def write(self, records: list[Record]) -> None:
+        for tag, value, step, walltime in records:
+            self._writer.add_scalar(tag, value, step, walltime=walltime)
+        self._writer.flush()
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class SinkCsv(Sink):
+    """
+    One row per record, appended; the header only for a fresh file
+
+    """
+
+    def __init__(self, filename: str):
+        is_fresh = not os.path.isfile(filename)
+        self._file = open(filename, "a", newline="")
+        self._writer = csv.writer(self._file)
+        if is_fresh:
+            self._writer.writerow(("tag", "value", "step", "walltime"))
+
+    def write(self, records: list[Record]) -> None:
+        self._writer.writerows(records)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class SinkJsonl(Sink):
+    """
+    One json-object per record (and line), appended
+
+    """
+
+    def __init__(self, filename: str):
+        self._file = open(filename, "a")
+
+    def write(self, records: list[Record]) -> None:
+        self._file.write(
+            "".join(
+                json.dumps(
+                    {"tag": tag, "value": value, "step": step, "walltime": walltime}
+                )
+                + "\n"
+                for tag, value, step, walltime in records
+            )
+        )
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def get_sinks(log_dir: str, formats: Iterable[str] = ("tensorboard",)) -> list[Sink]:
+    """
+    :param log_dir:
+    :param formats: any of "tensorboard", "csv", "jsonl"
+    :return:
+    """
+
+    Path(log_dir).mkdir(parents=True, exist_ok=True)
+
+    sink_makers = {
+        "tensorboard": lambda: SinkTensorboard(log_dir),
+        "csv": lambda: SinkCsv(os.path.join(log_dir, "metrics.csv")),
+        "jsonl": lambda: SinkJsonl(os.path.join(log_dir, "metrics.jsonl")),
+    }
+    for log_format in formats:
+        if log_format not in sink_makers:
+            raise ValueError("unknown log-format: {0}".format(log_format))
+
+    return [sink_makers[log_format]() for log_format in formats]
+
+
+class MetricsLogger:
+    """
+    Buffer scalars in memory, write them in batches on a background-thread:
+    1.  add_scalar() only appends to the buffer, i.e., no I/O on the caller
+    2.  the background-thread drains the buffer into every sink:
+        1.  every flush_interval seconds
+        2.  or earlier, once the buffer is half-full
+    3.  the buffer holds at most capacity records:
+    ->  if the sinks fall behind, the caller drains the full buffer itself
+    (and counts so), i.e., no record is ever dropped
+
+    NOTE:
+    1.  mimics SummaryWriter.add_scalar(), thus a drop-in for ModelDqn.writer
+    2.  a failing sink neither stops the background-thread nor the other sinks:
+    its error is kept, and re-raised on the next flush() or close()
+
+    """
+
+    def __init__(
+        self,
+        sinks: list[Sink],
+        flush_interval: float = 5.0,
+        capacity: int = 10000,
+    ):
+        self._sinks = sinks
+        self._flush_interval = flush_interval
+        self._capacity = capacity
+
+        self._buffer: collections.deque = collections.deque()
+        self._n_drained_caller = 0
+        self._lock_write = threading.Lock()
+        self._error: Optional[BaseException] = None
+
+        self._wake, self._stop = threading.Event(), threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def n_drained_caller(self) -> int:
+        return self._n_drained_caller
+
+    def add_scalar(
+        self, tag: str, value: float, step: int, walltime: Optional[float] = None
+    ) -> None:
+        if len(self._buffer) >= self._capacity:
+            self._n_drained_caller += 1
+            self._drain()
+        self._buffer.append(
+            (
+                tag,
+                float(value),
+                int(step),
+                time.time() if walltime is None else walltime,
+            )
+        )
+
+        if len(self._buffer) >= self._capacity // 2:
+            self._wake.set()
+
+    def _drain(self) -> None:
+        with self._lock_write:
+            records = [self._buffer.popleft() for __ in range(len(self._buffer))]
+            if records:
+                for sink in self._sinks:
+                    try:
+                        sink.write(records)
+                    except Exception as e:
+                        if self._error is None:
+                            self._error = e
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            self._drain()
+
+    def flush(self) -> None:
+        """
+        Write everything buffered so far, on the calling thread
+
+        :return:
+        """
+
+        self._drain()
+        self._raise_error()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+
+        self._drain()
+        for sink in self._sinks:
+            sink.close()
+        self._raise_error()
+
+
+def metrics_test(log_dir: str = "/tmp/shetris_metrics", n_episodes: int = 10000):
+    logger = MetricsLogger(get_sinks(log_dir, ("csv", "jsonl")), flush_interval=0.5)
+
+    time_start = time.perf_counter()
+    for episode_num in range(n_episodes):
+        logger.add_scalar("episodes/Number of Pieces", episode_num % 97, episode_num)
+        logger.add_scalar("episodes/Number of Lines", episode_num % 13, episode_num)
+    time_log = time.perf_counter() - time_start
+    logger.close()
+
+    print(
+        "[METRICS] {0:.2f}us per add_scalar(), {1} drained by the caller".format(
+            time_log / n_episodes / 2 * 1e6, logger.n_drained_caller
+        )
+    )
+
+
+if __name__ == "__main__":
+    pass
+    metrics_test()
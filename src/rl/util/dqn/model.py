@@ -1,23 +1,41 @@
 import os
 import random
 import shutil
-from collections import deque
 from pathlib import Path
-from typing import Callable, Any
+from typing import Callable, Any, Optional
 
-import numpy as np
 import torch
-from torch.utils.tensorboard import SummaryWriter
 
 from src.rl.shetris.env.reporter.combi import ActionToObs
 from src.rl.shetris.env.shenv import ShetrisEnv
+from src.rl.util.dqn.checkpoint import Checkpoint, CheckpointWriter
+from src.rl.util.dqn.metrics import MetricsLogger, get_sinks
 from src.rl.util.dqn.network import DeepQNetwork
+from src.rl.util.dqn.replay import ReplayBuffer, ReplayMemmap, ReplayPrioritized
 from src.rl.util.dqn.util import Agent
 
 
 class ModelDqn:
-    def __init__(self, env: ShetrisEnv):
-        self.model = DeepQNetwork()
+    def __init__(
+        self,
+        env: ShetrisEnv,
+        use_prioritized: bool = False,
+        do_resume: bool = False,
+        replay_dir: Optional[str] = None,
+        replay_memory_size: int = 30000,
+    ):
+        """
+        :param env:
+        :param use_prioritized:
+        :param do_resume: continue from the resume-checkpoint, if any
+        :param replay_dir: keep the replay-memory on disk, in this directory
+        ->  allows capacities far beyond the RAM; not with prioritized replay
+        :param replay_memory_size:
+        """
+
+        self.n_obs = len(env.provider.obs_factory.space_list)
+        self.obs_dtype = env.provider.obs_factory.dtype_torch
+        self.model = DeepQNetwork(self.n_obs)
         self.env = env
         self.action_to_obs = ActionToObs(env.engine, env.provider.obs_factory)
         self.agent = Agent(self.model, self.env)
@@ -33,10 +51,34 @@ class ModelDqn:
         self.save_progress_path = script_path + "/saveload/progress/"
         self.save_latest_path = script_path + "/saveload/"
         self.log_path = script_path + "/tensorboard"
-        self.writer = SummaryWriter(self.log_path)
-
-        self.replay_memory_size = 30000
-        self.replay_memory = deque(maxlen=self.replay_memory_size)
+        self.log_formats = ("tensorboard",)
+        self.writer = None
+        self.checkpoint_writer = CheckpointWriter()
+        self.do_resume = do_resume
+
+        self.replay_memory_size = replay_memory_size
+        self.use_prioritized = use_prioritized
+        if self.use_prioritized and replay_dir is not None:
+            raise ValueError("prioritized replay is not supported on disk")
+        if self.use_prioritized:
+            # anneal beta over all training-episodes (one sample per episode)
+            self.replay_memory = ReplayPrioritized(
+                self.replay_memory_size,
+                self.n_obs,
+                n_samples_anneal=self.n_episodes,
+                obs_dtype=self.obs_dtype,
+            )
+        elif replay_dir is not None:
+            self.replay_memory = ReplayMemmap(
+                self.replay_memory_size,
+                self.n_obs,
+                replay_dir,
+                env.provider.obs_factory.dtype,
+            )
+        else:
+            self.replay_memory = ReplayBuffer(
+                self.replay_memory_size, self.n_obs, self.obs_dtype
+            )
         # TODO:
         #   change to /10
         self.replay_memory_size_pre_fill = self.replay_memory_size / 100
@@ -57,11 +99,56 @@ class ModelDqn:
         self.setup()
 
     def setup(self):
+        """
+        1.  fresh start: clear the logs of any previous run
+        2.  resume: keep the logs, continue from the resume-checkpoint
+
+        :return:
+        """
+
         torch.manual_seed(123)
-        if os.path.isdir(self.log_path):
+        if not self.do_resume and os.path.isdir(self.log_path):
             shutil.rmtree(self.log_path)
         Path(self.log_path).mkdir(parents=True, exist_ok=True)
         Path(self.save_progress_path).mkdir(parents=True, exist_ok=True)
+        self.writer = MetricsLogger(get_sinks(self.log_path, self.log_formats))
+
+        if self.do_resume:
+            self.resume()
+
+    def resume(self) -> bool:
+        """
+        Restore the training-state from the resume-checkpoint:
+        1.  model and optimizer
+        2.  counters, thus also the epsilon-schedule (driven by episode_num)
+        3.  replay-memory, thus no pre-filling again
+
+        :return: if there was a resume-checkpoint at all
+        """
+
+        if not Checkpoint.exists(self.save_latest_path, "resume"):
+            print("[RESUME] no checkpoint: starting from scratch")
+            return False
+
+        self.model.load_state_dict(
+            Checkpoint.load_state_dict(self.save_latest_path, "resume")
+        )
+        Checkpoint.load_optimizer(self.save_latest_path, "resume", self.optimizer)
+
+        meta = Checkpoint.load_manifest(self.save_latest_path, "resume")["meta"]
+        self.episode_num, self.step_num = meta["episode_num"], meta["step_num"]
+        self.n_pieces, self.n_lines = meta["n_pieces"], meta["n_lines"]
+
+        replay = Checkpoint.load_replay(self.save_latest_path, "resume")
+        if replay is not None:
+            self.replay_memory.set_state(replay)
+
+        print(
+            "[RESUME] from episode {0}: replay-memory length {1}".format(
+                self.episode_num, len(self.replay_memory)
+            )
+        )
+        return True
 
     def do_eval_no_grad(self, functional: Callable) -> Any:
         """
@@ -94,7 +181,7 @@ class ModelDqn:
                 action, obs_next = self.do_eval_no_grad(self.agent.act_best)
             __, reward, done, __ = self.env.step(action)
             self.step_num += 1
-            self.replay_memory.append([obs, reward, obs_next, done])
+            self.replay_memory.append(obs, reward, obs_next, done)
 
             if done:
                 self.n_pieces, self.n_lines = self.env.n_pieces, self.env.n_lines
@@ -121,36 +208,7 @@ class ModelDqn:
                 # pre-building buffer
                 continue
             self.episode_num += 1
-
-            batch = random.sample(
-                self.replay_memory, min(len(self.replay_memory), self.batch_size)
-            )
-            obs_batch, reward_batch, obs_next_batch, done_batch = zip(*batch)
-            obs_batch = torch.stack(tuple(obs for obs in obs_batch))
-            reward_batch = torch.from_numpy(
-                np.array(reward_batch, dtype=np.float32)[:, None]
-            )
-            obs_next_batch = torch.stack(tuple(state for state in obs_next_batch))
-
-            q_values = self.model(obs_batch)
-            self.model.eval()
-            with torch.no_grad():
-                next_prediction_batch = self.model(obs_next_batch)
-            self.model.train()
-
-            y_batch = torch.cat(
-                tuple(
-                    reward if done else reward + self.gamma * prediction
-                    for reward, done, prediction in zip(
-                        reward_batch, done_batch, next_prediction_batch
-                    )
-                )
-            )[:, None]
-
-            self.optimizer.zero_grad()
-            loss = self.criterion(q_values, y_batch)
-            loss.backward()
-            self.optimizer.step()
+            self.learn()
 
             print(
                 "Episode-Nr.{0} of {1} | n_pieces {2} @ n_lines {3}".format(
@@ -164,16 +222,128 @@ class ModelDqn:
             self.save_progress()
 
         self.save_final()
+        self.close()
+
+    def learn(self) -> None:
+        """
+        One gradient-step on a batch from the replay-memory:
+        1.  uniform: plain MSE
+        2.  prioritized:
+            1.  MSE weighted by the importance-sampling weights
+            2.  re-prioritize the batch by its TD-errors
+
+        :return:
+        """
+
+        batch_size = min(len(self.replay_memory), self.batch_size)
+        if self.use_prioritized:
+            idx, weights = self.replay_memory.sample_idx_weights(batch_size)
+        else:
+            idx, weights = self.replay_memory.sample_idx(batch_size), None
+        obs_batch, reward_batch, obs_next_batch, done_batch = (
+            self.replay_memory.get_batch(idx)
+        )
+
+        q_values = self.model(obs_batch)
+        y_batch = self.get_td_target(reward_batch, obs_next_batch, done_batch)
+
+        self.optimizer.zero_grad()
+        if weights is None:
+            loss = self.criterion(q_values, y_batch)
+        else:
+            td_errors = y_batch - q_values
+            loss = (weights * td_errors.pow(2)).mean()
+            self.replay_memory.update_priorities(idx, td_errors.detach().abs()[:, 0])
+        loss.backward()
+        self.optimizer.step()
+
+    def get_td_target(
+        self,
+        reward_batch: torch.Tensor,
+        obs_next_batch: torch.Tensor,
+        done_batch: torch.Tensor,
+    ) -> torch.Tensor:
+        """
+        The TD-target of every transition, vectorized:
+        1.  if done: the reward
+        2.  otherwise: reward + gamma * predicted q-val of the next obs
+
+        :param reward_batch:
+        :param obs_next_batch:
+        :param done_batch:
+        :return:
+        """
+
+        next_prediction_batch = self.do_eval_no_grad(lambda: self.model(obs_next_batch))
+
+        return torch.where(
+            done_batch,
+            reward_batch,
+            reward_batch + self.gamma * next_prediction_batch,
+        )
+
+    def get_meta(self) -> dict[str, int]:
+        return {
+            "episode_num": self.episode_num,
+            "step_num": self.step_num,
+            "n_pieces": self.n_pieces,
+            "n_lines": self.n_lines,
+        }
 
     def save_progress(self):
+        """
+        Every save_interval episodes:
+        1.  a progress-checkpoint of this episode
+        2.  the resume-checkpoint, i.e., additionally with the replay-memory
+
+        :return:
+        """
+
         if self.episode_num > 0 and self.episode_num % self.save_interval == 0:
-            torch.save(
+            meta = self.get_meta()
+            self.checkpoint_writer.submit(
+                self.save_progress_path,
+                str(self.episode_num),
+                self.model,
+                self.optimizer,
+                meta,
+            )
+            self.checkpoint_writer.submit(
+                self.save_latest_path,
+                "resume",
                 self.model,
-                "{0}/{1}".format(self.save_progress_path, self.episode_num),
+                self.optimizer,
+                meta,
+                self.replay_memory.get_state(),
             )
 
     def save_final(self):
-        torch.save(self.model, "{0}/latest".format(self.save_latest_path))
+        """
+        Save the latest checkpoint, then wait for every pending save
+
+        :return:
+        """
+
+        self.checkpoint_writer.submit(
+            self.save_latest_path,
+            "latest",
+            self.model,
+            self.optimizer,
+            self.get_meta(),
+        )
+        self.checkpoint_writer.flush()
+
+    def close(self) -> None:
+        """
+        Write out every pending log and checkpoint, stop the background-threads
+
+        :return:
+        """
+
+        self.writer.close()
+        self.checkpoint_writer.close()
+        if isinstance(self.replay_memory, ReplayMemmap):
+            self.replay_memory.flush()
 
     def use_random(self) -> bool:
         """
@@ -212,9 +382,9 @@ class ModelDqn:
         self.writer.add_scalar("steps/Number of Lines", self.n_lines, step_num_log)
 
 
-def run_train():
+def run_train(do_resume: bool = False):
     env = ShetrisEnv()
-    model = ModelDqn(env)
+    model = ModelDqn(env, do_resume=do_resume)
 
     model.train()
 
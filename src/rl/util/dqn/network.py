@@ -7,10 +7,10 @@ class DeepQNetwork(nn.Module):
 
     """
 
-    def __init__(self):
+    def __init__(self, n_obs: int = 4):
         super().__init__()
 
-        self.conv1 = nn.Sequential(nn.Linear(4, 64), nn.ReLU(inplace=True))
+        self.conv1 = nn.Sequential(nn.Linear(n_obs, 64), nn.ReLU(inplace=True))
         self.conv2 = nn.Sequential(nn.Linear(64, 64), nn.ReLU(inplace=True))
         self.conv3 = nn.Sequential(nn.Linear(64, 1))
 
@@ -23,7 +23,8 @@ class DeepQNetwork(nn.Module):
                 nn.init.constant_(m.bias, 0)
 
     def forward(self, x):
-        x = self.conv1(x)
+        # the obs are stored compactly (ints): float only from here on
+        x = self.conv1(x.float())
         x = self.conv2(x)
         x = self.conv3(x)
 
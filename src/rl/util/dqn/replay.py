@@ -0,0 +1,582 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+import torch
+
+
+class ReplayBuffer:
+    """
+    Replay-memory as a ring-buffer of preallocated, contiguous tensors:
+    1.  one tensor per field of the transition: obs, reward, obs_next, done
+        ->  the obs in their (compact) obs_dtype, see ObsStandard
+    2.  once full, the oldest transition is overwritten
+    3.  sampling is by index, i.e., one gather per field
+
+    NOTE:
+    1.  sampling is without replacement, as random.sample() of the deque was
+
+    """
+
+    def __init__(self, capacity: int, n_obs: int, obs_dtype: torch.dtype = torch.float):
+        self._capacity = capacity
+
+        self.obs = torch.zeros((capacity, n_obs), dtype=obs_dtype)
+        self.reward = torch.zeros((capacity, 1), dtype=torch.float)
+        self.obs_next = torch.zeros((capacity, n_obs), dtype=obs_dtype)
+        self.done = torch.zeros((capacity, 1), dtype=torch.bool)
+
+        self._idx_next, self._size = 0, 0
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(
+        self, obs: torch.Tensor, reward: float, obs_next: torch.Tensor, done: bool
+    ) -> None:
+        """
+        Write one transition into the next slot
+
+        :param obs:
+        :param reward:
+        :param obs_next:
+        :param done:
+        :return:
+        """
+
+        idx = self._idx_next
+
+        self.obs[idx] = obs
+        self.reward[idx, 0] = reward
+        self.obs_next[idx] = obs_next
+        self.done[idx, 0] = done
+
+        self._idx_next = (idx + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def sample_idx(self, batch_size: int) -> torch.Tensor:
+        """
+        Distinct indexes, sorted:
+        1.  batch a large fraction of the size, e.g., right after pre-filling:
+        a permutation of all indexes
+        2.  otherwise: draw with replacement, then redraw the (few) duplicates
+        ->  no O(size) permutation per batch
+
+        :param batch_size: at most the size
+        :return:
+        """
+
+        size = len(self)
+        if 8 * batch_size >= size:
+            return torch.randperm(size)[:batch_size].sort().values
+
+        idx = torch.randint(0, size, (batch_size,)).unique()
+        while idx.shape[0] < batch_size:
+            idx = torch.cat(
+                (idx, torch.randint(0, size, (batch_size - idx.shape[0],)))
+            ).unique()
+        return idx
+
+    def get_batch(self, idx: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        """
+        Gather the transitions at the indexes
+
+        :param idx:
+        :return: obs, reward, obs_next, done; one row per transition
+        """
+
+        return self.obs[idx], self.reward[idx], self.obs_next[idx], self.done[idx]
+
+    def sample(self, batch_size: int) -> tuple[torch.Tensor, ...]:
+        return self.get_batch(self.sample_idx(batch_size))
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        """
+        Copy of the filled rows and the write-position, for snapshots
+
+        :return:
+        """
+
+        size = len(self)
+        return {
+            "obs": self.obs[:size].numpy().copy(),
+            "reward": self.reward[:size].numpy().copy(),
+            "obs_next": self.obs_next[:size].numpy().copy(),
+            "done": self.done[:size].numpy().copy(),
+            "idx_next": np.array(self._idx_next),
+        }
+
+    def set_state(self, state: dict[str, np.ndarray]) -> None:
+        """
+        Restore from get_state(), one bulk-copy per field
+
+        :param state:
+        :return:
+        """
+
+        size = state["obs"].shape[0]
+        if size > self._capacity:
+            raise ValueError(
+                "snapshot of {0} transitions exceeds capacity {1}".format(
+                    size, self._capacity
+                )
+            )
+
+        self.obs[:size] = torch.from_numpy(state["obs"])
+        self.reward[:size] = torch.from_numpy(state["reward"])
+        self.obs_next[:size] = torch.from_numpy(state["obs_next"])
+        self.done[:size] = torch.from_numpy(state["done"])
+        self._idx_next, self._size = int(state["idx_next"]) % self._capacity, size
+
+
+class ReplayShared(ReplayBuffer):
+    """
+    Replay-memory in shared memory, written by many (actor-)processes:
+    1.  the tensors are moved to shared memory
+    2.  the write-position and size are shared values
+    ->  a slot is claimed under the lock, but written outside of it
+
+    NOTE:
+    1.  a sampled slot might be overwritten concurrently; as with any
+    asynchronous replay, this rare staleness is tolerated
+    2.  must be created before, and passed to, the processes
+
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        n_obs: int,
+        ctx: Any,
+        obs_dtype: torch.dtype = torch.float,
+    ):
+        super().__init__(capacity, n_obs, obs_dtype)
+
+        for tensor in (self.obs, self.reward, self.obs_next, self.done):
+            tensor.share_memory_()
+
+        # idx_next, size, n_appended
+        self._counters = ctx.Array("q", 3)
+
+    @property
+    def n_appended(self) -> int:
+        return self._counters[2]
+
+    def __len__(self) -> int:
+        return self._counters[1]
+
+    def append(
+        self, obs: torch.Tensor, reward: float, obs_next: torch.Tensor, done: bool
+    ) -> None:
+        with self._counters.get_lock():
+            idx = self._counters[0]
+            self._counters[0] = (idx + 1) % self._capacity
+            self._counters[1] = min(self._counters[1] + 1, self._capacity)
+            self._counters[2] += 1
+
+        self.obs[idx] = obs
+        self.reward[idx, 0] = reward
+        self.obs_next[idx] = obs_next
+        self.done[idx, 0] = done
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        with self._counters.get_lock():
+            state = super().get_state()
+            state["idx_next"] = np.array(self._counters[0])
+            state["n_appended"] = np.array(self._counters[2])
+
+        return state
+
+    def set_state(self, state: dict[str, np.ndarray]) -> None:
+        super().set_state(state)
+
+        with self._counters.get_lock():
+            self._counters[0], self._counters[1] = self._idx_next, self._size
+            self._counters[2] = int(state.get("n_appended", self._size))
+
+
+class ReplayMemmap:
+    """
+    Replay-memory on disk, as a ring-buffer of fixed-size records:
+    1.  one record per transition: obs, reward, obs_next, done
+        ->  one contiguous read per sampled transition
+        ->  the obs in their (compact) obs_dtype, e.g., 13 bytes per record
+        for 4 obs-elements of uint8 (40 bytes in float32)
+    2.  the records live in a memory-mapped .npy-file
+    ->  only the pages in use stay in (the OS's page-)cache, thus capacities
+    far beyond the RAM
+    3.  the write-position and size go to a small json-file on flush()
+
+    NOTE:
+    1.  files of the same layout are reopened, i.e., survive restarts; files of
+    another layout (capacity, n_obs or obs_dtype) are refused, not overwritten
+    2.  the resume-state holds the counters only, the records stay on disk
+    ->  get_state() flushes on a background-thread, while training goes on
+    writing: on resuming, the records past the snapshot's write-position might
+    already be newer transitions (still valid ones, though)
+    3.  analysis-tools can read the records while training:
+            numpy.load(<directory>/records.npy, mmap_mode="r")
+    4.  sampling is with replacement; the indexes are sorted for locality
+
+    """
+
+    filename_records, filename_meta = "records.npy", "meta.json"
+
+    def __init__(
+        self,
+        capacity: int,
+        n_obs: int,
+        directory: str,
+        obs_dtype: np.dtype = np.float32,
+    ):
+        self._capacity, self._n_obs = capacity, n_obs
+        self._directory = Path(directory)
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+        self._dtype = np.dtype(
+            [
+                ("obs", obs_dtype, (n_obs,)),
+                ("reward", np.float32),
+                ("obs_next", obs_dtype, (n_obs,)),
+                ("done", np.bool_),
+            ]
+        )
+        self._idx_next, self._size = 0, 0
+        self._records = self._open()
+
+        self._flusher: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def _open(self) -> np.memmap:
+        """
+        1.  reopen the records (and counters) if their layout matches
+        2.  create fresh (sparse) records if there are none
+
+        :return:
+        """
+
+        path_records = self._directory / ReplayMemmap.filename_records
+        path_meta = self._directory / ReplayMemmap.filename_meta
+
+        if path_records.is_file() and path_meta.is_file():
+            records = np.load(path_records, mmap_mode="r+")
+            if records.dtype != self._dtype or records.shape != (self._capacity,):
+                raise ValueError(
+                    "[REPLAY] {0} holds {1} records of {2}, expected {3} of {4}; "
+                    "remove it to start afresh".format(
+                        path_records,
+                        records.shape[0],
+                        records.dtype,
+                        self._capacity,
+                        self._dtype,
+                    )
+                )
+            with open(path_meta) as f:
+                meta = json.load(f)
+            self._idx_next, self._size = meta["idx_next"], meta["size"]
+            return records
+
+        return np.lib.format.open_memmap(
+            path_records, mode="w+", dtype=self._dtype, shape=(self._capacity,)
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(
+        self, obs: torch.Tensor, reward: float, obs_next: torch.Tensor, done: bool
+    ) -> None:
+        self._records[self._idx_next] = (
+            np.asarray(obs),
+            reward,
+            np.asarray(obs_next),
+            done,
+        )
+
+        self._idx_next = (self._idx_next + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def sample_idx(self, batch_size: int) -> torch.Tensor:
+        return torch.from_numpy(np.sort(np.random.randint(0, self._size, batch_size)))
+
+    def get_batch(self, idx: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        """
+        Gather the records at the indexes, in one fancy-indexing
+
+        :param idx:
+        :return: obs, reward, obs_next, done; one row per transition
+        """
+
+        records = self._records[idx.numpy()]
+
+        return (
+            torch.from_numpy(np.ascontiguousarray(records["obs"])),
+            torch.from_numpy(np.ascontiguousarray(records["reward"][:, None])),
+            torch.from_numpy(np.ascontiguousarray(records["obs_next"])),
+            torch.from_numpy(np.ascontiguousarray(records["done"][:, None])),
+        )
+
+    def sample(self, batch_size: int) -> tuple[torch.Tensor, ...]:
+        return self.get_batch(self.sample_idx(batch_size))
+
+    def _write(self, idx_next: int, size: int) -> None:
+        """
+        Write out the records, then (atomically) the counters
+
+        :param idx_next:
+        :param size:
+        :return:
+        """
+
+        self._records.flush()
+
+        path_meta = self._directory / ReplayMemmap.filename_meta
+        with open(str(path_meta) + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "capacity": self._capacity,
+                    "n_obs": self._n_obs,
+                    "idx_next": idx_next,
+                    "size": size,
+                },
+                f,
+            )
+        os.replace(str(path_meta) + ".tmp", path_meta)
+
+    def _write_background(self, idx_next: int, size: int) -> None:
+        try:
+            self._write(idx_next, size)
+        except BaseException as e:
+            self._error = e
+
+    def _join(self) -> None:
+        """
+        Wait for the background-flush, if any, then re-raise its error
+
+        :return:
+        """
+
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def flush(self) -> None:
+        self._join()
+        self._write(self._idx_next, self._size)
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        """
+        The records are already on disk: snapshot only the counters, flush the
+        records on a background-thread
+
+        :return:
+        """
+
+        self._join()
+        self._flusher = threading.Thread(
+            target=self._write_background,
+            args=(self._idx_next, self._size),
+            daemon=True,
+        )
+        self._flusher.start()
+
+        return {"idx_next": np.array(self._idx_next), "size": np.array(self._size)}
+
+    def set_state(self, state: dict[str, np.ndarray]) -> None:
+        """
+        Restore the counters; also the rows, if the state has them (e.g., from
+        ReplayBuffer.get_state())
+
+        :param state:
+        :return:
+        """
+
+        if "obs" in state:
+            size = state["obs"].shape[0]
+            if size > self._capacity:
+                raise ValueError(
+                    "snapshot of {0} transitions exceeds capacity {1}".format(
+                        size, self._capacity
+                    )
+                )
+            self._records["obs"][:size] = state["obs"]
+            self._records["reward"][:size] = state["reward"][:, 0]
+            self._records["obs_next"][:size] = state["obs_next"]
+            self._records["done"][:size] = state["done"][:, 0]
+        else:
+            size = int(state["size"])
+
+        self._idx_next, self._size = int(state["idx_next"]) % self._capacity, size
+
+
+class SumTree:
+    """
+    Array-based sum-tree over the priorities of the transitions:
+    1.  node i has children 2i and 2i+1; the root is 1 and holds the total
+    2.  the leaves start at n_leaves, i.e., capacity rounded up to a power of 2
+    ->  the unused leaves keep priority 0, thus are never found
+    3.  batched: updating and finding take O(log n) vectorized steps for the
+    whole batch
+
+    """
+
+    def __init__(self, capacity: int):
+        self._n_leaves = 1 << max(capacity - 1, 1).bit_length()
+        self._depth = self._n_leaves.bit_length() - 1
+
+        self._tree = np.zeros(2 * self._n_leaves, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        return self._tree[1]
+
+    def get(self, idx: np.ndarray) -> np.ndarray:
+        return self._tree[idx + self._n_leaves]
+
+    def update(self, idx: np.ndarray, priorities: np.ndarray) -> None:
+        """
+        Set the leaves, then recompute their ancestors level by level
+
+        :param idx:
+        :param priorities:
+        :return:
+        """
+
+        nodes = idx + self._n_leaves
+        self._tree[nodes] = priorities
+        for __ in range(self._depth):
+            nodes = np.unique(nodes // 2)
+            self._tree[nodes] = self._tree[2 * nodes] + self._tree[2 * nodes + 1]
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """
+        For every value in [0, total), descend to the leaf whose cumulative
+        priority-range contains it
+
+        :param values:
+        :return: the indexes of the leaves
+        """
+
+        values = np.minimum(values, np.nextafter(self.total, 0))
+        nodes = np.ones(values.shape, dtype=np.int64)
+        for __ in range(self._depth):
+            left = self._tree[2 * nodes]
+            go_right = values >= left
+            values = values - left * go_right
+            nodes = 2 * nodes + go_right
+
+        return nodes - self._n_leaves
+
+
+class ReplayPrioritized(ReplayBuffer):
+    """
+    Prioritized experience replay:
+        https://arxiv.org/abs/1511.05952
+    1.  transitions are sampled with probability p_i^alpha / sum_k p_k^alpha,
+    stratified over batch_size equal segments of the total
+    2.  importance-sampling weights (N * P(i))^-beta, normalized by their max,
+    with beta annealed linearly to 1 over n_samples_anneal calls to sample
+    3.  new transitions enter with the max priority seen so far
+    ->  every transition is replayed at least about once
+
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        n_obs: int,
+        alpha: float = 0.6,
+        beta_init: float = 0.4,
+        n_samples_anneal: int = 3000,
+        eps: float = 1e-3,
+        obs_dtype: torch.dtype = torch.float,
+    ):
+        super().__init__(capacity, n_obs, obs_dtype)
+
+        self._tree = SumTree(capacity)
+        self._alpha, self._eps = alpha, eps
+        self._beta_init, self._n_samples_anneal = beta_init, n_samples_anneal
+        self._n_samples = 0
+
+        self._priority_max = 1.0
+
+    @property
+    def beta(self) -> float:
+        progress = min(self._n_samples / self._n_samples_anneal, 1.0)
+        return self._beta_init + progress * (1.0 - self._beta_init)
+
+    def append(
+        self, obs: torch.Tensor, reward: float, obs_next: torch.Tensor, done: bool
+    ) -> None:
+        idx = self._idx_next
+        super().append(obs, reward, obs_next, done)
+
+        self._tree.update(np.array((idx,)), np.array((self._priority_max,)))
+
+    def sample_idx_weights(self, batch_size: int) -> tuple[torch.Tensor, ...]:
+        """
+        Sample the indexes (stratified by priority) and their IS-weights
+
+        :param batch_size:
+        :return: indexes, weights of shape (batch_size, 1)
+        """
+
+        segment = self._tree.total / batch_size
+        values = (np.arange(batch_size) + np.random.random(batch_size)) * segment
+        idx = np.minimum(self._tree.find(values), self._size - 1)
+
+        probs = self._tree.get(idx) / self._tree.total
+        weights = (self._size * probs) ** -self.beta
+        weights /= weights.max()
+        self._n_samples += 1
+
+        return (
+            torch.from_numpy(idx),
+            torch.from_numpy(weights.astype(np.float32)[:, None]),
+        )
+
+    def update_priorities(self, idx: torch.Tensor, td_errors: torch.Tensor) -> None:
+        """
+        Re-prioritize the sampled transitions by their latest TD-errors
+
+        :param idx:
+        :param td_errors: absolute TD-errors, one per index
+        :return:
+        """
+
+        priorities = (td_errors.numpy().astype(np.float64) + self._eps) ** self._alpha
+        self._tree.update(idx.numpy(), priorities)
+        self._priority_max = max(self._priority_max, float(priorities.max()))
+
+    def get_state(self) -> dict[str, np.ndarray]:
+        state = super().get_state()
+        state["priorities"] = self._tree.get(np.arange(self._size))
+        state["priority_max"] = np.array(self._priority_max)
+        state["n_samples"] = np.array(self._n_samples)
+
+        return state
+
+    def set_state(self, state: dict[str, np.ndarray]) -> None:
+        super().set_state(state)
+
+        self._tree.update(np.arange(self._size), state["priorities"])
+        self._priority_max = float(state["priority_max"])
+        self._n_samples = int(state["n_samples"])
+
+
+if __name__ == "__main__":
+    pass
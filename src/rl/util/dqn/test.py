@@ -7,7 +7,7 @@ from src.rl.util.gym.runner import RunnerGym
 
 def test_run():
     env = ShetrisEnv()
-    model = Loader().load_model()
+    model = Loader().load_inference()
     agent = Agent(model, env)
 
     r_ins = RunnerGym(env)
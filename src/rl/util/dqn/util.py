@@ -1,12 +1,15 @@
 import os
 import random
 from pathlib import Path
-from typing import Tuple, Any
+from typing import Tuple, Any, Union
 
 import torch
 
 from src.rl.shetris.env.reporter.combi import ActionToObs
 from src.rl.shetris.env.shenv import ShetrisEnv
+from src.rl.util.dqn.checkpoint import Checkpoint
+from src.rl.util.dqn.inference import Inference, get_inference
+from src.rl.util.dqn.network import DeepQNetwork
 
 
 class Loader:
@@ -16,7 +19,9 @@ class Loader:
 
     def load_model(self):
         """
-        1.  load the model from the path
+        1.  load the model from the path:
+            1.  checkpoint (state_dict): memory-map the weights, no unpickling
+            2.  otherwise: unpickle the whole (legacy) model
         2.  set the model in eval() mode
 
         :return:
@@ -24,14 +29,31 @@ class Loader:
 
         torch.manual_seed(123)
 
-        model = torch.load(
-            "{0}/latest".format(self.save_latest_path),
-            map_location=lambda storage, loc: storage,
-        )
+        if Checkpoint.exists(str(self.save_latest_path), "latest"):
+            state_dict = Checkpoint.load_state_dict(
+                str(self.save_latest_path), "latest"
+            )
+            model = DeepQNetwork(state_dict["conv1.0.weight"].shape[1])
+            model.load_state_dict(state_dict)
+        else:
+            model = torch.load(
+                "{0}/latest".format(self.save_latest_path),
+                map_location=lambda storage, loc: storage,
+            )
         model.eval()
 
         return model
 
+    def load_inference(self, backend: str = "auto") -> Inference:
+        """
+        load the model, for acting only
+
+        :param backend: one of "numpy", "torch", "auto"
+        :return:
+        """
+
+        return get_inference(self.load_model(), backend)
+
 
 class Chooser:
     @staticmethod
@@ -51,6 +73,46 @@ class Chooser:
         best_idx = torch.argmax(q_val_all).item()
         return best_idx
 
+    @staticmethod
+    def get_idx_best_segmented(
+        q_val_all: torch.Tensor, lengths: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        find, for every segment of consecutive q_vals, the (global) index that
+        produces the highest q_val of that segment
+        1.  pad the segments into the rows of a matrix, -inf as filler
+        2.  argmax of every row, i.e., the first index that attains its max
+        3.  shift back by the offset of every segment
+
+        NOTE:
+        1.  NaN counts as -inf, i.e., never chosen over a number; an all-NaN
+        segment picks its first index
+        2.  an empty segment gets the index len(q_val_all), i.e., none
+
+        :param q_val_all: q_vals of all segments, concatenated
+        :param lengths: length of every segment
+        :return:
+        """
+
+        n_segments = lengths.shape[0]
+        segment_ids = torch.repeat_interleave(torch.arange(n_segments), lengths)
+        offsets = torch.cumsum(lengths, 0) - lengths
+        positions = torch.arange(q_val_all.shape[0]) - offsets[segment_ids]
+
+        q_val_padded = torch.full(
+            (n_segments, max(int(lengths.max()), 1) if n_segments else 1),
+            float("-inf"),
+            dtype=q_val_all.dtype,
+        )
+        q_val_padded[segment_ids, positions] = torch.nan_to_num(
+            q_val_all, nan=float("-inf")
+        )
+
+        idx_best = offsets + torch.argmax(q_val_padded, dim=1)
+        return torch.where(
+            lengths > 0, idx_best, torch.full_like(idx_best, q_val_all.shape[0])
+        )
+
     @staticmethod
     def get_action_obs_best(q_val_all, action_all, obs_all):
         idx = Chooser.get_idx_best(q_val_all)
@@ -62,7 +124,7 @@ class Chooser:
 
 
 class Agent:
-    def __init__(self, model: torch.nn.Module, env: ShetrisEnv):
+    def __init__(self, model: Union[torch.nn.Module, Inference], env: ShetrisEnv):
         self._model = model
         self._env = env
         self._action_to_obs = ActionToObs(
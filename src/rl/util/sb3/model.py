@@ -1,4 +1,4 @@
-from typing import Type, Callable, Any
+from typing import Type, Callable, Any, Union
 
 import gym
 import stable_baselines3
@@ -141,18 +141,32 @@ class ModelFactory:
 
     @staticmethod
     def create_model(
-        env_sb3: VecEnv, alg: Any, policy: Type[BasePolicy], tb_dir: str
+        env_sb3: VecEnv,
+        alg: Any,
+        policy: Union[Type[BasePolicy], str],
+        tb_dir: str,
+        seed: int = 147,
+        **kwargs,
     ) -> BaseAlgorithm:
         """
         Create the model from scratch
 
         NOTE:
         1.  the env must be sb3-model
-
+        2.  the policy can also be given by sb3's name, e.g., "MlpPolicy"
+
+        :param env_sb3:
+        :param alg:
+        :param policy:
+        :param tb_dir:
+        :param seed:
+        :param kwargs: hyperparameters of the alg, e.g., learning_rate
         :return:
         """
 
-        return alg(policy, env_sb3, verbose=1, tensorboard_log=tb_dir, seed=147)
+        return alg(
+            policy, env_sb3, verbose=1, tensorboard_log=tb_dir, seed=seed, **kwargs
+        )
 
     @staticmethod
     def inspect_on_policy_specifics(model: OnPolicyAlgorithm):
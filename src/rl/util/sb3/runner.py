@@ -1,12 +1,70 @@
+import io
+import multiprocessing
+import os
 import time
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 import gym
+import numpy as np
 from stable_baselines3.common.base_class import BaseAlgorithm
 from stable_baselines3.common.vec_env import VecEnv
 
 from src.rl.util.gym.runner import RunnerGym
 
+# the model and env of this (worker-)process, see Runner.eval_parallel()
+_worker_state: dict[str, Any] = {}
+
+
+def _init_worker(
+    alg: type[BaseAlgorithm],
+    model_data: bytes,
+    env_maker: Callable[[], gym.Env],
+    deterministic: bool,
+    max_steps: int,
+) -> None:
+    import torch
+
+    torch.set_num_threads(1)
+
+    _worker_state["model"] = alg.load(io.BytesIO(model_data), device="cpu")
+    _worker_state["env"] = env_maker()
+    _worker_state["deterministic"] = deterministic
+    _worker_state["max_steps"] = max_steps
+
+
+def _run_episode_headless(seed: int) -> tuple[int, float, int, float, float]:
+    """
+    One episode in a worker: no rendering, no sleeping, at most max_steps
+    steps (a good policy might never finish)
+
+    :param seed: of the env (and of the model's sampling)
+    :return: seed, reward, length, n_pieces, n_lines (nan if not an attribute
+    of the env)
+    """
+
+    import torch
+
+    model, env = _worker_state["model"], _worker_state["env"]
+    max_steps = _worker_state["max_steps"]
+    torch.manual_seed(seed)
+    env.seed(seed)
+
+    obs = env.reset()
+    reward_total, length, done = 0.0, 0, False
+    while not done and length < max_steps:
+        action, __ = model.predict(obs, deterministic=_worker_state["deterministic"])
+        obs, reward, done, __ = env.step(action)
+        reward_total += reward
+        length += 1
+
+    return (
+        seed,
+        reward_total,
+        length,
+        getattr(env.unwrapped, "n_pieces", float("nan")),
+        getattr(env.unwrapped, "n_lines", float("nan")),
+    )
+
 
 class Runner:
     """
@@ -18,7 +76,9 @@ class Runner:
     """
 
     @staticmethod
-    def eval_sb3(model: BaseAlgorithm, env: VecEnv, n_eval_episodes: int = 5):
+    def eval_sb3(
+        model: BaseAlgorithm, env: VecEnv, n_eval_episodes: int = 5
+    ) -> tuple[float, float]:
         """
         Use sb3's internal evaluation:
         1.  mean-reward
@@ -40,6 +100,105 @@ class Runner:
         )
         print("[REWARD] (mean {0}) += (std {1})".format(mean_reward, std_reward))
 
+        return mean_reward, std_reward
+
+    @staticmethod
+    def get_stats(values: np.ndarray) -> dict[str, float]:
+        stats = {"mean": float(np.mean(values)), "std": float(np.std(values))}
+        for q in (5, 25, 50, 75, 95):
+            stats["q{0:02}".format(q)] = float(np.percentile(values, q))
+
+        return stats
+
+    @staticmethod
+    def eval_parallel(
+        model: BaseAlgorithm,
+        env_maker: Callable[[], gym.Env],
+        n_episodes: int = 100,
+        n_workers: Optional[int] = None,
+        seed: int = 147,
+        deterministic: bool = True,
+        max_steps: int = 10000,
+    ) -> dict[str, Any]:
+        """
+        Headless evaluation over a pool of worker-processes:
+        1.  every worker loads the (serialized) model and creates its env once
+        2.  episode i is seeded with seed+i, thus reproducible regardless of
+        the number of workers
+        3.  statistics of reward, length, n_pieces and n_lines: mean, std and
+        quantiles; also the throughput
+
+        :param model:
+        :param env_maker: picklable, creates a headless gym-env
+        :param n_episodes:
+        :param n_workers: default: one per cpu
+        :param seed:
+        :param deterministic:
+        :param max_steps: per episode; the episode is cut off thereafter
+        :return:
+        """
+
+        buffer = io.BytesIO()
+        model.save(buffer)
+        n_workers = min(n_workers or os.cpu_count() or 1, n_episodes)
+
+        time_start = time.perf_counter()
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(
+            n_workers,
+            initializer=_init_worker,
+            initargs=(
+                type(model),
+                buffer.getvalue(),
+                env_maker,
+                deterministic,
+                max_steps,
+            ),
+        ) as pool:
+            results = sorted(
+                pool.imap_unordered(
+                    _run_episode_headless, range(seed, seed + n_episodes)
+                )
+            )
+        time_total = time.perf_counter() - time_start
+
+        __, rewards, lengths, n_pieces, n_lines = (
+            np.array(column) for column in zip(*results)
+        )
+        evaluation = {
+            "n_episodes": n_episodes,
+            "n_truncated": int((lengths >= max_steps).sum()),
+            "reward": Runner.get_stats(rewards),
+            "length": Runner.get_stats(lengths),
+            "n_pieces": Runner.get_stats(n_pieces),
+            "n_lines": Runner.get_stats(n_lines),
+            "episodes_per_s": n_episodes / time_total,
+            "steps_per_s": lengths.sum() / time_total,
+        }
+        print(
+            "[EVAL] {0} episodes on {1} workers: {2:.1f} episodes/s, "
+            "{3:.0f} steps/s, {4} cut off at {5} steps".format(
+                n_episodes,
+                n_workers,
+                evaluation["episodes_per_s"],
+                evaluation["steps_per_s"],
+                evaluation["n_truncated"],
+                max_steps,
+            )
+        )
+        for name in ("reward", "n_pieces", "n_lines"):
+            print(
+                "    {0:>8}: {1}".format(
+                    name,
+                    ", ".join(
+                        "{0} {1:.1f}".format(key, value)
+                        for key, value in evaluation[name].items()
+                    ),
+                )
+            )
+
+        return evaluation
+
     @staticmethod
     def get_action_generator_model(model: BaseAlgorithm, obs: Any) -> Callable:
         """
@@ -1,11 +1,60 @@
+import io
+import json
 import os
+import queue
+import threading
+import time
 from pathlib import Path
-from typing import Type, Optional
+from typing import Type, Optional, Callable, Any
 
 from stable_baselines3.common.base_class import BaseAlgorithm
 from stable_baselines3.common.vec_env import VecEnv
 
 
+class RetentionPolicy:
+    """
+    Which numbered saves to keep, i.e., kept by any of the rules:
+    1.  keep_last: the most recent ones; None for no such rule
+    2.  keep_best: the ones of the highest eval-score (if scored)
+    3.  keep_every: of the older ones, every keep_every-th (thinning-out)
+    ->  without any rule (the default), everything is kept
+
+    """
+
+    def __init__(
+        self,
+        keep_last: Optional[int] = None,
+        keep_best: int = 0,
+        keep_every: Optional[int] = None,
+    ):
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.keep_every = keep_every
+
+    def get_kept(self, entries: list[dict[str, Any]]) -> set[int]:
+        """
+        :param entries: of the manifest, ordered by number
+        :return: the numbers to keep
+        """
+
+        numbers = [entry["n"] for entry in entries]
+        if self.keep_last is None and self.keep_best <= 0 and not self.keep_every:
+            return set(numbers)
+
+        kept = set()
+        if self.keep_last is not None and self.keep_last > 0:
+            kept.update(numbers[-self.keep_last :])
+
+        scored = [entry for entry in entries if entry["score"] is not None]
+        scored.sort(key=lambda entry: entry["score"], reverse=True)
+        kept.update(entry["n"] for entry in scored[: self.keep_best])
+
+        if self.keep_every:
+            kept.update(n for n in numbers if n % self.keep_every == 0)
+
+        return kept
+
+
 class SaveLoad:
     """
     Handle the saving and loading of models
@@ -15,23 +64,48 @@ class SaveLoad:
     Structure:
     <...>/base_dir
         |__ ./progress/
+        |   |__ manifest.json
         |   |__ 0.zip
         |   |__ 1.zip
         |   |__ ...
         |__ latest.zip
 
+    NOTE:
+    1.  the manifest indexes every numbered save: number, step, time, score
+    ->  finding the latest needs no listing of the progress-dir
+    ->  it also keeps the next number to issue: never reused, even if the
+    retention-policy has removed the latest saves
+    2.  the model is serialized (in memory) on the caller; writing the file,
+    updating the manifest and applying the retention-policy happen on a
+    background-thread
+    3.  every file is written to a temporary, then renamed, i.e., atomic
+    4.  an error of the background-thread is re-raised on the caller, by the
+    next save or flush()
+
     """
 
+    manifest_name = "manifest.json"
+
     def __init__(
         self,
         base_dir: str,
         progress_name: str = "./progress/",
         latest_name: str = "./latest",
+        retention: Optional[RetentionPolicy] = None,
     ):
         self.progress_dir = base_dir + progress_name
         self.latest_name = base_dir + latest_name
+        self.retention = RetentionPolicy() if retention is None else retention
 
         self._curr_cycle_n: int = 0
+        self._entries: list[dict[str, Any]] = []
+        self._next_progress: int = 0
+        self._lock_entries = threading.Lock()
+
+        self._queue: queue.Queue = queue.Queue()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
 
     @property
     def curr_cycle_n(self):
@@ -41,17 +115,104 @@ class SaveLoad:
     def curr_cycle_n(self, value: int):
         self._curr_cycle_n = value
 
-    def save_numbered(self, model: BaseAlgorithm) -> None:
+    @property
+    def manifest_filename(self) -> str:
+        return os.path.join(self.progress_dir, SaveLoad.manifest_name)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                job()
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def flush(self) -> None:
+        """
+        Block until every pending save is written
+
+        :return:
+        """
+
+        self._queue.join()
+        self._raise_error()
+
+    @staticmethod
+    def _get_serialized(model: BaseAlgorithm) -> bytes:
+        buffer = io.BytesIO()
+        model.save(buffer)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _write_atomic(
+        filename: str, write: Callable[[Any], Any], mode: str = "wb"
+    ) -> None:
+        with open(filename + ".tmp", mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(filename + ".tmp", filename)
+
+    def _write_manifest(self) -> None:
+        # with _lock_entries held
+        SaveLoad._write_atomic(
+            self.manifest_filename,
+            lambda f: json.dump(
+                {"entries": self._entries, "next_progress": self._next_progress}, f
+            ),
+            mode="w",
+        )
+
+    def _apply_retention(self) -> None:
+        # with _lock_entries held
+        kept = self.retention.get_kept(self._entries)
+        removed = [entry for entry in self._entries if entry["n"] not in kept]
+        self._entries = [entry for entry in self._entries if entry["n"] in kept]
+        self._write_manifest()
+
+        for entry in removed:
+            Path(self.progress_dir, "{0}.zip".format(entry["n"])).unlink(
+                missing_ok=True
+            )
+
+    def save_numbered(self, model: BaseAlgorithm, score: Optional[float] = None):
         """
         1.  save to "<location>-<curr_number>"
+        2.  index it in the manifest, then apply the retention-policy
 
         :param model:
+        :param score: the eval-score, if any
         :return:
         """
 
-        filename = os.path.join(self.progress_dir, str(self.curr_cycle_n))
-        model.save(filename)
-
+        self._raise_error()
+        data = SaveLoad._get_serialized(model)
+        entry = {
+            "n": self.curr_cycle_n,
+            "step": int(model.num_timesteps),
+            "time": time.time(),
+            "score": score,
+        }
+
+        def job():
+            filename = os.path.join(self.progress_dir, "{0}.zip".format(entry["n"]))
+            SaveLoad._write_atomic(filename, lambda f: f.write(data))
+            with self._lock_entries:
+                # a from-scratch run overwrites the saves of the same number
+                self._entries = [e for e in self._entries if e["n"] != entry["n"]]
+                self._entries.append(entry)
+                self._entries.sort(key=lambda e: e["n"])
+                self._next_progress = max(self._next_progress, entry["n"] + 1)
+                self._apply_retention()
+
+        self._queue.put(job)
         self.curr_cycle_n += 1
 
     def save_latest(self, model: BaseAlgorithm) -> None:
@@ -62,13 +223,21 @@ class SaveLoad:
         1.  After a long training cycle, save:
             1.  the final result
             2.  to the final-location
+        2.  waits for every pending (numbered) save as well
 
         :param model:
         :return:
         """
 
         print("Saving model {0} to {1}".format(model, self.latest_name))
-        model.save(self.latest_name)
+        self._raise_error()
+        data = SaveLoad._get_serialized(model)
+        self._queue.put(
+            lambda: SaveLoad._write_atomic(
+                self.latest_name + ".zip", lambda f: f.write(data)
+            )
+        )
+        self.flush()
         print("DONE")
 
     def load_latest(
@@ -109,34 +278,67 @@ class SaveLoad:
         else:
             return False
 
-    def get_max_progress(self) -> int:
+    def _load_entries(self) -> list[dict[str, Any]]:
+        """
+        1.  from the manifest, along with the next number to issue
+        2.  without one (saves of before the manifest): index the progress-dir
+        once, i.e., every <some-number>.zip, then write the manifest
+
+        :return:
         """
-        1.  find the max file-stem in the progress-dir
 
-        NOTE:
-        1.  it is implicitly assumed that all progress saveloads are
-        ->  <some-number>.zip
+        if os.path.isfile(self.manifest_filename):
+            with open(self.manifest_filename) as f:
+                manifest = json.load(f)
+            entries = manifest["entries"]
+            # manifests of before the counter: the latest kept save
+            self._next_progress = manifest.get(
+                "next_progress", entries[-1]["n"] + 1 if entries else 0
+            )
+            return entries
+
+        entries = []
+        for file in os.listdir(self.progress_dir):
+            path = Path(self.progress_dir, file)
+            if path.is_file() and path.suffix == ".zip" and path.stem.isdigit():
+                entries.append(
+                    {
+                        "n": int(path.stem),
+                        "step": None,
+                        "time": path.stat().st_mtime,
+                        "score": None,
+                    }
+                )
+        entries.sort(key=lambda entry: entry["n"])
+
+        self._entries = entries
+        self._next_progress = entries[-1]["n"] + 1 if entries else 0
+        self._write_manifest()
+        return entries
+
+    def get_entries(self) -> list[dict[str, Any]]:
+        with self._lock_entries:
+            return list(self._entries)
+
+    def get_max_progress(self) -> int:
+        """
+        1.  find the max number ever issued to a numbered save, by the
+        manifest (even if no longer kept)
 
         :return:
 
         """
 
-        file_stems = [
-            int(Path(file).stem)
-            for file in os.listdir(self.progress_dir)
-            if os.path.isfile(os.path.join(self.progress_dir, file))
-        ]
-        if file_stems:
-            return max(file_stems)
-        else:
-            return -1
+        with self._lock_entries:
+            return self._next_progress - 1
 
     def init(self) -> bool:
         """
         1.  create the progress-dir
         ->  actually not required, as sb3 will create it itself, but will
         produce a warning
-        2.  Check that training could continue
+        2.  load the manifest
+        3.  Check that training could continue
             ->  if yes: set the internal counter to the next stem-number
             ->  else: directly return false
 
@@ -145,6 +347,8 @@ class SaveLoad:
 
         if not os.path.isdir(self.progress_dir):
             Path(self.progress_dir).mkdir(parents=True, exist_ok=True)
+        with self._lock_entries:
+            self._entries = self._load_entries()
 
         if self.could_continue():
             self.curr_cycle_n = self.get_max_progress() + 1